@@ -1,20 +1,21 @@
 from fastapi import APIRouter, Request, Depends, HTTPException
 from app.auth.firebase import verify_firebase_token
 from app.storage import get_storage_backend
+from app.storage.write_behind import get_write_buffer
 import logging
 
 router = APIRouter()
 
 @router.post("/saveAccount")
-async def save_account(request: Request, user=Depends(verify_firebase_token)):
+async def save_account(request: Request, user=Depends(verify_firebase_token), writes=Depends(get_write_buffer)):
     body = await request.json()
     account_json = body.get("account_json")
     if not account_json:
         raise HTTPException(status_code=400, detail="Missing account_json")
     user_id = user['uid']
-    storage = get_storage_backend()
     try:
-        storage.save_json(user_id, "account.json", account_json)
+        # Skipped when unchanged; coalesced with rapid follow-up saves when write-behind is on
+        await writes.save(user_id, "account.json", account_json)
         logging.info(f"User {user_id} saved account")
         return {"status": "success"}
     except Exception as e:
@@ -22,7 +23,7 @@ async def save_account(request: Request, user=Depends(verify_firebase_token)):
         raise HTTPException(status_code=500, detail="Failed to save account")
 
 @router.post("/deleteAccount")
-async def delete_user(request: Request, user=Depends(verify_firebase_token)):
+async def delete_user(request: Request, user=Depends(verify_firebase_token), storage=Depends(get_storage_backend)):
     body = await request.json()
     user_id = body.get("userId")
     reason = body.get("reason")
@@ -36,7 +37,6 @@ async def delete_user(request: Request, user=Depends(verify_firebase_token)):
     if user_id != user['uid']:
         raise HTTPException(status_code=403, detail="User ID does not match authenticated user")
 
-    storage = get_storage_backend()
     try:
         # Store the deletion reason in a dedicated file
         deletion_data = {
@@ -44,7 +44,7 @@ async def delete_user(request: Request, user=Depends(verify_firebase_token)):
             "additionalReason": additional_reason,
             "timestamp": timestamp
         }
-        storage.save_json(user_id, "deletion_reason.json", deletion_data)
+        await storage.save_json(user_id, "deletion_reason.json", deletion_data)
         logging.info(f"User {user_id} requested account deletion: {deletion_data}")
         return {"status": "success"}
     except Exception as e:
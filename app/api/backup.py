@@ -1,77 +1,404 @@
-from fastapi import APIRouter, Request, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, Request, Depends, HTTPException, Query, status, UploadFile, File, Form
+from fastapi.responses import StreamingResponse
 from app.auth.firebase import verify_firebase_token
 from app.storage import get_storage_backend
-from app.core import get_backup_limit
+from app.storage.chunked_backup import CHUNKED_FORMAT, ChunkedBackupStore, is_chunked_manifest_bytes
+from app.storage.backup_index import DOCUMENT_FORMAT, BackupIndex, backup_path
+from app.storage.summary_packs import SummaryPackStore, summary_path
+from app.serialization import loads
+from app.storage.streams import GZIP_WBITS, gunzip_stream, gzip_stream, prepend
+from app.core import (
+    get_backup_limit, get_full_backup_chunked, get_storage_stream_chunk_size,
+    get_full_backup_max_bytes, get_full_backup_stream_min_bytes, get_storage_upload_chunk_size,
+    get_summary_batch_max_items, get_summary_batch_max_bytes, get_summary_batch_concurrency,
+    get_summary_range_max_days, get_summary_packs_enabled,
+)
+import asyncio
 import logging
 import datetime
 import json
-from datetime import datetime, timezone
+import re
+import zlib
+from datetime import date as date_type, datetime, timezone
 
 router = APIRouter()
 
-def update_backup_limiter(storage, user_id, backup_date, backup_limit):
+# Responses smaller than this are sent uncompressed
+GZIP_MIN_BYTES = 1024
+# Streamed uploads look for exportedAt in this much of the (decompressed) body
+EXPORTED_AT_SCAN_BYTES = 64 * 1024
+EXPORTED_AT_PATTERN = re.compile(rb'"exportedAt"\s*:\s*"([^"]*)"')
+INSPECT_PIECE_BYTES = 1024 * 1024
+SUMMARY_DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+def is_summary_date(value) -> bool:
+    """Summary dates name the stored object, so only real YYYY-MM-DD dates are accepted."""
+    if not isinstance(value, str) or not SUMMARY_DATE_PATTERN.fullmatch(value):
+        return False
+    try:
+        date_type.fromisoformat(value)
+    except ValueError:
+        return False
+    return True
+
+def accepts_gzip(request: Request) -> bool:
+    return "gzip" in request.headers.get("accept-encoding", "").lower()
+
+def is_gzip_body(request: Request) -> bool:
+    return request.headers.get("content-encoding", "").lower() == "gzip"
+
+def content_length(request: Request):
+    try:
+        return int(request.headers["content-length"])
+    except (KeyError, ValueError):
+        return None
+
+def request_too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Request body exceeds {max_bytes} bytes")
+
+async def limited_body_chunks(request: Request, max_bytes: int):
+    """Yield the request body as it arrives, failing with 413 once it passes max_bytes."""
+    length = content_length(request)
+    if length is not None and length > max_bytes:
+        raise request_too_large(max_bytes)
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > max_bytes:
+            raise request_too_large(max_bytes)
+        yield chunk
+
+async def read_json_body(request: Request, max_bytes: int):
+    """Parse a JSON request body of at most max_bytes, gunzipping it when sent with Content-Encoding: gzip."""
+    body = b"".join([chunk async for chunk in limited_body_chunks(request, max_bytes)])
+    if is_gzip_body(request):
+        decompressor = zlib.decompressobj(GZIP_WBITS)
+        try:
+            # Bounded so a small gzip bomb can't inflate past the limit
+            body = decompressor.decompress(body, max_bytes + 1)
+        except zlib.error:
+            raise HTTPException(status_code=400, detail="Invalid gzip request body")
+        if len(body) > max_bytes:
+            raise request_too_large(max_bytes)
+        if not decompressor.eof:
+            raise HTTPException(status_code=400, detail="Invalid gzip request body")
+    return loads(body)
+
+def json_stream_response(request: Request, chunks, content_encoding=None, size=None) -> StreamingResponse:
+    """
+    Stream already-serialized JSON. Stored gzip bytes pass straight through
+    when the client accepts gzip; otherwise chunks are (de)compressed on the
+    fly to match what the client accepts.
+    """
+    headers = {"Vary": "Accept-Encoding"}
+    if content_encoding == "gzip" and not accepts_gzip(request):
+        chunks, content_encoding, size = gunzip_stream(chunks), None, None
+    elif content_encoding is None and accepts_gzip(request) and (size is None or size >= GZIP_MIN_BYTES):
+        chunks, content_encoding, size = gzip_stream(chunks), "gzip", None
+    if content_encoding:
+        headers["Content-Encoding"] = content_encoding
+    if size is not None:
+        headers["Content-Length"] = str(size)
+    return StreamingResponse(chunks, media_type="application/json", headers=headers)
+
+async def update_backup_limiter(storage, user_id, backup_date, backup_limit):
     limiter_path = 'backupLimiter.json'
     data = {"date": backup_date, "counter": 1}
-    if storage.file_exists(user_id, limiter_path):
-        existing = storage.load_json(user_id, limiter_path)
-        if existing.get("date") == backup_date:
-            data["counter"] = existing.get("counter", 1) + 1
-        # else: new day, counter stays 1
-    storage.save_json(user_id, limiter_path, data)
+    existing, _ = await storage.load_json_or_default(user_id, limiter_path, {})
+    if existing.get("date") == backup_date:
+        data["counter"] = existing.get("counter", 1) + 1
+    # else: new day (or first backup), counter stays 1
+    await storage.save_json(user_id, limiter_path, data)
     # Return True if allowed, False if limit exceeded
     return data["counter"] <= backup_limit, data
 
+async def after_summary_write(packs: SummaryPackStore, user_id: str, date: str):
+    # The summary itself is saved by now; a failure here must not report it as lost
+    try:
+        await packs.after_write(user_id, date)
+    except Exception as e:
+        logging.error(f"Summary pack update after {date} failed for user {user_id}: {e}")
+
 @router.post("/backupDateSummary")
-async def backup_date_summary(request: Request, user=Depends(verify_firebase_token)):
+async def backup_date_summary(request: Request, user=Depends(verify_firebase_token), storage=Depends(get_storage_backend)):
     body = await request.json()
     date = body.get("date")
     data_json = body.get("data_json")
     if not date or not data_json:
         raise HTTPException(status_code=400, detail="Missing date or data_json")
+    if not is_summary_date(date):
+        raise HTTPException(status_code=400, detail="date must be YYYY-MM-DD")
     user_id = user['uid']
-    storage = get_storage_backend()
     try:
-        storage.save_json(user_id, f"data/{date}.json", data_json)
-        logging.info(f"User {user_id} backed up summary for {date}")
-        return {"status": "success"}
+        await storage.save_json(user_id, summary_path(date), data_json)
     except Exception as e:
         logging.error(f"Backup error for user {user_id}: {e}")
         raise HTTPException(status_code=500, detail="Failed to save summary")
+    await after_summary_write(SummaryPackStore(storage), user_id, date)
+    logging.info(f"User {user_id} backed up summary for {date}")
+    return {"status": "success"}
+
+def summary_entry_error(summary):
+    """Why one batch entry can't be saved, or None when it's valid."""
+    if not isinstance(summary, dict) or not summary.get("date") or not summary.get("data_json"):
+        return "Missing date or data_json"
+    if not is_summary_date(summary["date"]):
+        return "date must be YYYY-MM-DD"
+    return None
+
+@router.post("/backupDateSummaries")
+async def backup_date_summaries(request: Request, user=Depends(verify_firebase_token), storage=Depends(get_storage_backend)):
+    """
+    Batch form of /backupDateSummary for clients catching up on several days:
+    {"summaries": [{"date": ..., "data_json": ...}, ...]}, optionally gzipped.
+
+    Summaries are uploaded concurrently (at most SUMMARY_BATCH_CONCURRENCY at
+    a time) and each gets its own status in request order, so one failed
+    upload doesn't fail the batch. When a date appears more than once the
+    last entry is the one saved.
+    """
+    body = await read_json_body(request, get_summary_batch_max_bytes())
+    summaries = body.get("summaries") if isinstance(body, dict) else None
+    if not isinstance(summaries, list) or not summaries:
+        raise HTTPException(status_code=400, detail="Missing summaries")
+    max_items = get_summary_batch_max_items()
+    if len(summaries) > max_items:
+        raise HTTPException(status_code=400, detail=f"Too many summaries, at most {max_items} per request")
+    user_id = user['uid']
+
+    # Entries are checked one by one so a bad one only fails itself
+    errors = [summary_entry_error(summary) for summary in summaries]
+    last_position = {}
+    for position, summary in enumerate(summaries):
+        if errors[position] is None:
+            last_position[summary["date"]] = position
+    to_save = set(last_position.values())
+    packs = SummaryPackStore(storage)
+    semaphore = asyncio.Semaphore(get_summary_batch_concurrency())
+
+    async def save(position: int, summary) -> dict:
+        date = summary.get("date") if isinstance(summary, dict) else None
+        if errors[position] is not None:
+            return {"date": date, "status": "error", "detail": errors[position]}
+        if position not in to_save:
+            return {"date": date, "status": "success", "detail": "Superseded by a later entry"}
+        async with semaphore:
+            try:
+                await storage.save_json(user_id, summary_path(date), summary["data_json"])
+            except Exception as e:
+                logging.error(f"Backup error for user {user_id} on {date}: {e}")
+                return {"date": date, "status": "error", "detail": "Failed to save summary"}
+            await after_summary_write(packs, user_id, date)
+            return {"date": date, "status": "success"}
+
+    results = await asyncio.gather(*(save(position, summary) for position, summary in enumerate(summaries)))
+    saved = sum(result["status"] == "success" for result in results)
+    logging.info(f"User {user_id} backed up {saved}/{len(results)} summaries in one batch")
+    return {"status": "success" if saved == len(results) else "partial", "results": results}
+
+async def _bytes_once(data: bytes):
+    yield data
+
+@router.get("/dateSummaries")
+async def get_date_summaries(
+    request: Request,
+    from_date: date_type = Query(..., alias="from"),
+    to_date: date_type = Query(..., alias="to"),
+    user=Depends(verify_firebase_token),
+    storage=Depends(get_storage_backend),
+):
+    """
+    Return the stored daily summaries between from and to (inclusive) as
+    {"from": ..., "to": ..., "summaries": {date: data_json}}; days without a
+    summary are left out. Completed months are served from monthly packs
+    when available; stored summaries are relayed without being parsed.
+    """
+    if to_date < from_date:
+        raise HTTPException(status_code=400, detail="from must not be after to")
+    max_days = get_summary_range_max_days()
+    if (to_date - from_date).days + 1 > max_days:
+        raise HTTPException(status_code=400, detail=f"Date range too long, at most {max_days} days")
+    user_id = user['uid']
+    try:
+        summaries = await SummaryPackStore(storage).read_range(user_id, from_date, to_date, use_packs=get_summary_packs_enabled())
+    except Exception as e:
+        logging.error(f"Date summaries read error for user {user_id}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to retrieve summaries")
+    logging.info(f"User {user_id} read {len(summaries)} summaries from {from_date} to {to_date}")
+    entries = b",".join(json.dumps(day).encode("utf-8") + b":" + raw for day, raw in summaries.items())
+    payload = b'{"from":"%s","to":"%s","summaries":{%s}}' % (from_date.isoformat().encode(), to_date.isoformat().encode(), entries)
+    return json_stream_response(request, _bytes_once(payload), size=len(payload))
+
+def resolve_backup_date(exported_at, user_id: str) -> str:
+    today_str = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    if not exported_at:
+        logging.warning(f"No exportedAt field in backup for user {user_id}")
+        return today_str
+    try:
+        backup_date = datetime.fromisoformat(exported_at).strftime("%Y-%m-%d")
+    except Exception as e:
+        logging.warning(f"Invalid exportedAt format: {exported_at} for user {user_id}: {e}")
+        return today_str
+    if backup_date != today_str:
+        logging.warning(f"Backup date {backup_date} (from exportedAt) does not match today {today_str} (UTC) for user {user_id}")
+    return backup_date
+
+async def check_backup_limit(storage, user_id: str, backup_date: str):
+    """Fail early, without using up a slot, when the day's backup limit is already reached."""
+    backup_limit = get_backup_limit()
+    existing, _ = await storage.load_json_or_default(user_id, 'backupLimiter.json', {})
+    if existing.get("date") == backup_date and existing.get("counter", 0) >= backup_limit:
+        raise HTTPException(status_code=429, detail=f"Daily backup limit ({backup_limit}) reached for {backup_date}")
+
+async def enforce_backup_limit(storage, user_id: str, backup_date: str):
+    backup_limit = get_backup_limit()
+    allowed, limiter_data = await update_backup_limiter(storage, user_id, backup_date, backup_limit)
+    logging.info(f"Backup limiter for user {user_id}: {limiter_data}")
+    if not allowed:
+        raise HTTPException(status_code=429, detail=f"Daily backup limit ({backup_limit}) reached for {backup_date}")
+
+class _BodyShape:
+    """
+    Tracks the decompressed size and the first and last non-whitespace bytes
+    of a streamed body, enough to reject anything that isn't a JSON object
+    without parsing it.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.first = None
+        self.last = None
+
+    def feed(self, data: bytes):
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise request_too_large(self.max_bytes)
+        stripped = data.strip()
+        if stripped:
+            if self.first is None:
+                self.first = stripped[:1]
+            self.last = stripped[-1:]
+
+    def is_object(self) -> bool:
+        return self.first == b"{" and self.last == b"}"
+
+async def stream_full_backup_upload(request: Request, storage, user_id: str, max_bytes: int):
+    """
+    Store the request body as a gzipped single-document backup without
+    parsing or buffering it. Only the first EXPORTED_AT_SCAN_BYTES are held
+    back, to find exportedAt (and so the target path) before the upload
+    starts; after that bytes go to a resumable upload as they arrive.
+    Gzipped bodies are stored as sent. Returns (backup_date, path).
+    """
+    chunks = limited_body_chunks(request, max_bytes)
+    gzipped = is_gzip_body(request)
+    decompressor = zlib.decompressobj(GZIP_WBITS) if gzipped else None
+    shape = _BodyShape(max_bytes)
+    head = bytearray()
+
+    def inspect(chunk: bytes):
+        if decompressor is None:
+            feed(chunk)
+            return
+        # Gzip input is inflated a bounded piece at a time, so a
+        # highly-compressed chunk can't spike memory before the size check.
+        # A full piece may leave output pending even with no input left.
+        while True:
+            try:
+                piece = decompressor.decompress(chunk, INSPECT_PIECE_BYTES)
+            except zlib.error:
+                raise HTTPException(status_code=400, detail="Invalid gzip request body")
+            feed(piece)
+            chunk = decompressor.unconsumed_tail
+            if not chunk and len(piece) < INSPECT_PIECE_BYTES:
+                break
+
+    def feed(piece: bytes):
+        shape.feed(piece)
+        if len(head) < EXPORTED_AT_SCAN_BYTES:
+            head.extend(piece[:EXPORTED_AT_SCAN_BYTES - len(head)])
+
+    held = []
+    match = None
+    async for chunk in chunks:
+        held.append(chunk)
+        inspect(chunk)
+        match = EXPORTED_AT_PATTERN.search(head)
+        if match or len(head) >= EXPORTED_AT_SCAN_BYTES:
+            break
+    exported_at = match.group(1).decode("utf-8", "replace") if match else None
+    backup_date = resolve_backup_date(exported_at, user_id)
+    await check_backup_limit(storage, user_id, backup_date)
+
+    path = backup_path(backup_date)
+    upload = await storage.open_upload(user_id, path, get_storage_upload_chunk_size(), content_encoding="gzip")
+    compressor = None if gzipped else zlib.compressobj(6, zlib.DEFLATED, GZIP_WBITS)
+
+    async def send(chunk: bytes):
+        await upload.write(chunk if compressor is None else compressor.compress(chunk))
+
+    try:
+        for chunk in held:
+            await send(chunk)
+        held = None
+        # Picks up where the exportedAt scan stopped
+        async for chunk in chunks:
+            inspect(chunk)
+            await send(chunk)
+        if decompressor is not None and not decompressor.eof:
+            raise HTTPException(status_code=400, detail="Invalid gzip request body")
+        if not shape.is_object():
+            raise HTTPException(status_code=400, detail="Backup must be a JSON object")
+        # Counted only once the body is known to be a valid backup
+        await enforce_backup_limit(storage, user_id, backup_date)
+        if compressor is not None:
+            await upload.write(compressor.flush())
+        await upload.close()
+    except BaseException:
+        # Too large, invalid, over the limit or disconnected: cancel the
+        # upload so it can't replace an existing backup for this date.
+        # Shielded so a cancelled request still gets it done.
+        await asyncio.shield(upload.abort())
+        raise
+    return backup_date, path
+
+def should_stream_upload(request: Request) -> bool:
+    if not get_full_backup_chunked():
+        return True
+    length = content_length(request)
+    return length is not None and length >= get_full_backup_stream_min_bytes()
 
 @router.post("/fullBackup")
 async def full_backup(
     request: Request,
-    user=Depends(verify_firebase_token)
+    user=Depends(verify_firebase_token),
+    storage=Depends(get_storage_backend)
 ):
     user_id = user['uid']
-    storage = get_storage_backend()
+    max_bytes = get_full_backup_max_bytes()
     try:
-        body = await request.json()
-        exported_at = body.get("exportedAt")
-        backup_date = None
-        today_str = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-        if exported_at:
-            try:
-                dt = datetime.fromisoformat(exported_at)
-                backup_date = dt.strftime("%Y-%m-%d")
-                if backup_date != today_str:
-                    logging.warning(f"Backup date {backup_date} (from exportedAt) does not match today {today_str} (UTC) for user {user_id}")
-            except Exception as e:
-                logging.warning(f"Invalid exportedAt format: {exported_at} for user {user_id}: {e}")
-                backup_date = today_str
+        index = BackupIndex(storage)
+        if should_stream_upload(request):
+            # Large (or unchunked) backups go to storage as they arrive
+            backup_date, path = await stream_full_backup_upload(request, storage, user_id, max_bytes)
+            logging.info(f"User {user_id} streamed full backup for {backup_date}")
+            backup_format = DOCUMENT_FORMAT
         else:
-            logging.warning(f"No exportedAt field in backup for user {user_id}")
-            backup_date = today_str
-
-        backup_limit = get_backup_limit()
-        allowed, limiter_data = update_backup_limiter(storage, user_id, backup_date, backup_limit)
-        logging.info(f"Backup limiter for user {user_id}: {limiter_data}")
-        if not allowed:
-            raise HTTPException(status_code=429, detail=f"Daily backup limit ({backup_limit}) reached for {backup_date}")
-
-        path = f"full_backups/{backup_date}.json"
-        storage.save_json(user_id, path, body)
-        logging.info(f"User {user_id} uploaded full backup for {backup_date}")
+            body = await read_json_body(request, max_bytes)
+            if not isinstance(body, dict):
+                raise HTTPException(status_code=400, detail="Backup must be a JSON object")
+            backup_date = resolve_backup_date(body.get("exportedAt"), user_id)
+            await enforce_backup_limit(storage, user_id, backup_date)
+            path = backup_path(backup_date)
+            # Only sections that changed since the previous backup are uploaded
+            previous_path = await index.latest_path(user_id)
+            stats = await ChunkedBackupStore(storage).save(user_id, path, body, previous_path)
+            logging.info(f"User {user_id} uploaded full backup for {backup_date}: {stats}")
+            backup_format = CHUNKED_FORMAT
+        pruned = await index.record(user_id, backup_date, path, backup_format)
+        if pruned:
+            logging.info(f"Pruned full backups for user {user_id}: {pruned}")
         return {"status": "success"}
     except HTTPException as e:
         raise e
@@ -79,17 +406,54 @@ async def full_backup(
         logging.error(f"Full backup error for user {user_id}: {e}")
         raise HTTPException(status_code=500, detail="Failed to save full backup")
 
+async def stream_full_backup(request: Request, storage, user_id: str, path: str) -> StreamingResponse:
+    chunk_size = get_storage_stream_chunk_size()
+    size, content_encoding, chunks = await storage.open_raw_stream(user_id, path, chunk_size)
+    # Read the first chunk up front so storage errors still become a 500
+    # and so manifests can be told apart from single-document backups
+    first = await anext(chunks, b"")
+    if content_encoding is None and is_chunked_manifest_bytes(first):
+        raw = first + b"".join([chunk async for chunk in chunks])
+        body = ChunkedBackupStore(storage).stream(user_id, loads(raw), chunk_size)
+        return json_stream_response(request, body)
+    # Single-document backups are relayed as stored, without parsing or buffering them
+    return json_stream_response(request, prepend(first, chunks), content_encoding, size)
+
 @router.get("/lastFullBackup")
-async def get_last_full_backup(user=Depends(verify_firebase_token)):
+async def get_last_full_backup(request: Request, user=Depends(verify_firebase_token), storage=Depends(get_storage_backend)):
     user_id = user['uid']
-    storage = get_storage_backend()
     try:
-        path = storage.get_latest_full_backup_path(user_id)
+        path = await BackupIndex(storage).latest_path(user_id)
         if not path:
             raise HTTPException(status_code=404, detail="No backup found")
         logging.info(f"Getting last full backup for user {user_id} at {path}")
-        data = storage.load_json(user_id, path)
-        return data
+        return await stream_full_backup(request, storage, user_id, path)
+    except HTTPException as e:
+        raise e
     except Exception as e:
         logging.error(f"Get last full backup error for user {user_id}: {e}")
-        raise HTTPException(status_code=500, detail="Failed to retrieve last full backup") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Failed to retrieve last full backup")
+
+@router.get("/fullBackups")
+async def list_full_backups(user=Depends(verify_firebase_token), storage=Depends(get_storage_backend)):
+    user_id = user['uid']
+    try:
+        return {"backups": await BackupIndex(storage).entries(user_id)}
+    except Exception as e:
+        logging.error(f"List full backups error for user {user_id}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to list full backups")
+
+@router.get("/fullBackups/{backup_date}")
+async def get_full_backup_by_date(backup_date: str, request: Request, user=Depends(verify_firebase_token), storage=Depends(get_storage_backend)):
+    user_id = user['uid']
+    try:
+        path = await BackupIndex(storage).path_for_date(user_id, backup_date)
+        if not path:
+            raise HTTPException(status_code=404, detail=f"No backup found for {backup_date}")
+        logging.info(f"Getting full backup for user {user_id} at {path}")
+        return await stream_full_backup(request, storage, user_id, path)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logging.error(f"Get full backup error for user {user_id}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to retrieve full backup")
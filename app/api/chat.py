@@ -1,98 +1,223 @@
-from fastapi import APIRouter, Request, Depends, HTTPException
+from fastapi import APIRouter, Request, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from app.auth.firebase import verify_firebase_token
 from app.rate_limit.limiter import RateLimiter
-from app.core import get_openai_api_key, get_openai_chat_model, get_rate_limit_chat_messages_per_day
+from app.llm.provider import get_llm_provider, LLMProviderError
+from app.llm.router import get_model_router, is_retryable
+from app.serialization import dumps
+from app.core import get_openai_chat_model, get_openai_fallback_chat_model, get_rate_limit_chat_messages_per_day, get_rate_limit_chat_tokens_per_request, get_chat_fast_token_estimate
+import asyncio
+import functools
 import logging
-import httpx
 import tiktoken
-import os
 
 router = APIRouter()
 
+# Backend-enforced OpenAI parameters
+MAX_TOKENS = 500 # 100 words ≈ 130–140 tokens.
+TEMPERATURE = 1.0
+
+# Keeps fire-and-forget limiter updates alive until they finish
+_background_tasks = set()
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(model):
+    # encoding_for_model loads and builds the BPE ranks, do it once per model
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        logging.warning(f"No tiktoken encoding registered for {model}, using cl100k_base")
+        return tiktoken.get_encoding("cl100k_base")
+
+def preload_encodings():
+    """Warm the encoding cache at startup so the first chat doesn't pay for it."""
+    for model in (get_openai_chat_model(), get_openai_fallback_chat_model()):
+        try:
+            get_encoding(model)
+        except Exception as e:
+            logging.warning(f"Could not preload tiktoken encoding for {model}: {e}")
+
+def _message_texts(messages):
+    return [str(value) for m in messages for value in m.values()]
+
 # Accurate token counting using tiktoken
 # OpenAI's chat format: each message is a dict with 'role' and 'content'
 def count_message_tokens(messages, model):
-    encoding = tiktoken.encoding_for_model(model)
-    num_tokens = 0
-    for m in messages:
-        num_tokens += 4  # every message follows <im_start>{role/name}\n{content}<im_end>\n
-        for key, value in m.items():
-            num_tokens += len(encoding.encode(str(value)))
+    encoding = get_encoding(model)
+    # every message follows <im_start>{role/name}\n{content}<im_end>\n
+    num_tokens = 4 * len(messages)
+    num_tokens += sum(len(tokens) for tokens in encoding.encode_ordinary_batch(_message_texts(messages)))
     num_tokens += 2  # every reply is primed with <im_start>assistant
     return num_tokens
 
-async def _chat_ai_proxy(messages, model, user_id):
-    # Backend-enforced OpenAI parameters
-    max_tokens = 500 # 100 words ≈ 130–140 tokens.
-    temperature = 1.0
+def estimate_message_tokens_upper_bound(messages):
+    # A BPE token always covers at least one UTF-8 byte, so bytes bound tokens from above
+    num_bytes = sum(len(text.encode("utf-8")) for text in _message_texts(messages))
+    return 4 * len(messages) + num_bytes + 2
+
+async def count_request_tokens(messages, model):
+    """
+    Token count used for the per-request limit check. When the cheap upper
+    bound already fits under the limit, the exact BPE pass is skipped; the
+    limiter later records OpenAI's reported prompt_tokens anyway.
+    """
+    if get_chat_fast_token_estimate():
+        estimate = estimate_message_tokens_upper_bound(messages)
+        if estimate <= get_rate_limit_chat_tokens_per_request():
+            return estimate
+    # Full tokenization is CPU bound, keep it off the event loop
+    return await asyncio.to_thread(count_message_tokens, messages, model)
 
+async def _reserve(messages, model, user_id):
+    """Validate the request, count its tokens and reserve a message slot."""
     if not messages or not isinstance(messages, list):
         raise HTTPException(status_code=400, detail="Missing or invalid messages")
-    
+
     limiter = RateLimiter(user_id)
-    tokens = count_message_tokens(messages, model)
-    ok, reason = limiter.check(tokens)
+    tokens = await count_request_tokens(messages, model)
+    ok, reason = await limiter.check_and_reserve(tokens)
     if not ok:
         logging.warning(f"Token check failed: {tokens} tokens in request. Reason: {reason}")
         raise HTTPException(status_code=429, detail=f"{reason} (tokens in request: {tokens})")
+    return limiter, tokens
 
-    openai_api_key = get_openai_api_key()
-    headers = {
-        "Authorization": f"Bearer {openai_api_key}",
-        "Content-Type": "application/json"
+def _rate_limit_info(current_usage):
+    return {
+        "daily_limit": get_rate_limit_chat_messages_per_day(),
+        "usage": current_usage
     }
-    payload = {
-        "model": model,
-        "messages": messages,
-        "max_tokens": max_tokens,
-        "temperature": temperature,
+
+def _proxy_failure(error, user_id, action):
+    """HTTPException for a chat call that no model could answer."""
+    if isinstance(error, LLMProviderError) and 400 <= error.status_code < 500 and not is_retryable(error):
+        # Upstream refused the request itself (bad key, invalid messages, ...)
+        logging.error(f"{action} rejected upstream with status {error.status_code} for user {user_id}: {error.body}")
+        return HTTPException(status_code=502, detail="Chat request rejected by upstream model")
+    logging.error(f"{action} failed for user {user_id}: {error}")
+    return HTTPException(status_code=500, detail="Failed to proxy chat request")
+
+async def _chat_ai_proxy(messages, user_id):
+    # Token count and limiter decision are made once, whichever model answers
+    limiter, tokens = await _reserve(messages, get_openai_chat_model(), user_id)
+    provider = get_llm_provider()
+
+    async def complete(model):
+        data = await provider.chat(messages, model=model, max_tokens=MAX_TOKENS, temperature=TEMPERATURE)
+        # Extract the reply here so a malformed answer fails this attempt, not the winner
+        return data, data["choices"][0]["message"]["content"].strip()
+
+    try:
+        (data, reply), model = await get_model_router().route(complete)
+    except Exception as e:
+        await limiter.release()
+        raise _proxy_failure(e, user_id, "Chat request")
+
+    # Use actual prompt_tokens from OpenAI response if available
+    usage = data.get("usage", {})
+    prompt_tokens = usage.get("prompt_tokens", tokens)
+    # commit returns the usage it just wrote, no need to read it back; it
+    # never raises, a failed write falls back to the reserved usage
+    current_usage = await limiter.commit(prompt_tokens)
+
+    logging.info(f"User {user_id} proxied chatAI via {model} with usage: {usage}")
+    return {
+        "reply": reply,
+        "rate_limit": _rate_limit_info(current_usage)
     }
 
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        response = await client.post(
-            "https://api.openai.com/v1/chat/completions",
-            headers=headers,
-            json=payload
-        )
-    if response.status_code == 200:
-        data = response.json()
-        reply = data["choices"][0]["message"]["content"].strip()
-        # Use actual prompt_tokens from OpenAI response if available
-        usage = data.get("usage", {})
-        prompt_tokens = usage.get("prompt_tokens", tokens)
-        limiter.increment(prompt_tokens)
-        
-        # Get current usage after incrementing
-        current_usage = limiter._get_usage()
-        daily_limit = get_rate_limit_chat_messages_per_day()
-        
-        logging.info(f"User {user_id} proxied chatAI with usage: {usage}")
-        return {
-            "reply": reply, 
-            "rate_limit": {
-                "daily_limit": daily_limit,
-                "usage": current_usage
-            }
-        }
-    else:
-        logging.error(f"OpenAI error for user {user_id}: {response.text}")
-        raise HTTPException(status_code=500, detail=f"OpenAI error: {response.text}")
+def _sse(data, event=None):
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {dumps(data).decode('utf-8')}\n\n"
+
+async def _relay_stream(first_chunk, chunks, limiter, tokens, user_id):
+    """
+    Relay OpenAI deltas as server-sent events. Usage from the final chunk is
+    committed to the rate limiter and returned in the closing "done" event.
+    """
+    usage = {}
+    delivered = False
+    settled = False
+    try:
+        chunk = first_chunk
+        while chunk is not None:
+            if chunk.get("usage"):
+                usage = chunk["usage"]
+            for choice in chunk.get("choices") or []:
+                content = (choice.get("delta") or {}).get("content")
+                if content:
+                    delivered = True
+                    yield _sse({"delta": content})
+            chunk = await anext(chunks, None)
+
+        settled = True
+        current_usage = await limiter.commit(usage.get("prompt_tokens", tokens))
+        logging.info(f"User {user_id} streamed chatAI with usage: {usage}")
+        yield _sse({"rate_limit": _rate_limit_info(current_usage)}, event="done")
+    except Exception as e:
+        logging.error(f"Chat stream failed for user {user_id}: {e}")
+        if not settled:
+            settled = True
+            # Once text reached the client the message counts, otherwise give the slot back
+            if delivered:
+                await limiter.commit(usage.get("prompt_tokens", tokens))
+            else:
+                await limiter.release()
+        yield _sse({"error": "Chat stream interrupted"}, event="error")
+    finally:
+        if not settled:
+            # Client disconnected mid-stream. We may be inside a cancelled
+            # scope here, so settle the reservation in a separate task, and
+            # schedule it before awaiting anything that could be cancelled.
+            settle = limiter.commit(usage.get("prompt_tokens", tokens)) if delivered else limiter.release()
+            task = asyncio.create_task(settle)
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
+        await chunks.aclose()
+
+async def _chat_ai_stream(messages, user_id):
+    limiter, tokens = await _reserve(messages, get_openai_chat_model(), user_id)
+    provider = get_llm_provider()
+
+    async def open_stream(model):
+        chunks = provider.stream_chat(messages, model=model, max_tokens=MAX_TOKENS, temperature=TEMPERATURE)
+        try:
+            # Wait for the first chunk so upstream failures surface before the
+            # response has started and the router can still fall back
+            return await anext(chunks), chunks
+        except BaseException:
+            await chunks.aclose()
+            raise
+
+    async def close_stream(result):
+        await result[1].aclose()
+
+    try:
+        (first_chunk, chunks), model = await get_model_router().route(open_stream, close_stream)
+    except BaseException as e:
+        await limiter.release()
+        if not isinstance(e, Exception):
+            raise
+        raise _proxy_failure(e, user_id, "Chat stream start")
+    return StreamingResponse(
+        _relay_stream(first_chunk, chunks, limiter, tokens, user_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _wants_stream(request: Request, stream: bool) -> bool:
+    return stream or "text/event-stream" in request.headers.get("accept", "")
 
 @router.post("/chatAIProxy")
-async def chat_ai_proxy(request: Request, user=Depends(verify_firebase_token)):
+async def chat_ai_proxy(
+    request: Request,
+    stream: bool = Query(False, description="Stream the reply as server-sent events"),
+    user=Depends(verify_firebase_token)
+):
     body = await request.json()
     messages = body.get("messages")
     user_id = user['uid']
-    
-    # Try with default model first
-    model = get_openai_chat_model()
-    try:
-        return await _chat_ai_proxy(messages, model, user_id)
-    except Exception as e:
-        # If the primary model fails, try with gpt-3.5-turbo
-        logging.warning(f"Primary model failed for user {user_id}, falling back to gpt-3.5-turbo. Error: {e}")
-        try:
-            return await _chat_ai_proxy(messages, "gpt-3.5-turbo", user_id)
-        except Exception as fallback_error:
-            logging.error(f"Fallback model also failed for user {user_id}: {fallback_error}")
-            raise HTTPException(status_code=500, detail="Failed to proxy chat request") 
\ No newline at end of file
+    # Model fallback (and optional hedging) happens inside, see app.llm.router.
+    # Validation and rate-limit errors are returned as-is, not retried.
+    if _wants_stream(request, stream):
+        return await _chat_ai_stream(messages, user_id)
+    return await _chat_ai_proxy(messages, user_id)
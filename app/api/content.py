@@ -1,13 +1,62 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from app.auth.firebase import verify_firebase_token
-from firebase_admin import storage
+from app.storage import get_storage_backend
+from app.http_cache import make_etag, etag_matches, cache_headers, not_modified
+from app.cache.ttl_cache import AsyncTTLCache
+from app.core import get_content_index_refresh_seconds
+from app.serialization import dumps
+from typing import Optional, Tuple
 import json
+import logging
 import re
 
 router = APIRouter()
 
+# Small manifest written alongside each published daily_content_N.json:
+# {"version": N, "path": "content/daily_content_N.json"}
+CONTENT_MANIFEST_PATH = "content/latest.json"
+
+# This regex finds the version number in filenames like 'daily_content_123.json'
+VERSION_PATTERN = re.compile(r"daily_content_(\d+)\.json")
+
+async def _find_latest_content(storage) -> Tuple[int, Optional[str]]:
+    """Return (version, path) of the newest daily content, or (0, None)."""
+    try:
+        manifest = await storage.load_object_json(CONTENT_MANIFEST_PATH)
+        return int(manifest["version"]), manifest["path"]
+    except FileNotFoundError:
+        logging.warning(f"{CONTENT_MANIFEST_PATH} not found, scanning content/ for the latest version")
+
+    # Fallback for buckets without a manifest: cost grows with every published file
+    latest_version = 0
+    latest_path = None
+    for name in await storage.list_object_names("content/"):
+        match = VERSION_PATTERN.search(name)
+        if match:
+            current_version = int(match.group(1))
+            if current_version > latest_version:
+                latest_version = current_version
+                latest_path = name
+    return latest_version, latest_path
+
+# Latest (version, path). Refreshed in the background (stale-while-revalidate)
+# once CONTENT_INDEX_REFRESH_SECONDS have passed, so requests never wait on it
+# after the first load.
+_latest_cache = AsyncTTLCache("content_latest", ttl=get_content_index_refresh_seconds(), stale_ttl=24 * 60 * 60)
+
+# (serialized content, generation) per published version. Published files don't
+# change, and only the newest version is served, so a couple of entries is enough.
+# Content is kept as JSON bytes so responses don't re-serialize it per request.
+_content_cache = AsyncTTLCache("content", ttl=24 * 60 * 60, max_size=2)
+
+async def _load_content(storage, path: str):
+    content, generation = await storage.load_object_json_or_default(path)
+    if content is None:
+        raise FileNotFoundError(f"{path} not found")
+    return dumps(content), generation
+
 @router.get("/content/daily")
-async def get_daily_content(version: int = Query(0, description="The current version of the content on the client."), user=Depends(verify_firebase_token)):
+async def get_daily_content(request: Request, response: Response, version: int = Query(0, description="The current version of the content on the client."), user=Depends(verify_firebase_token), storage=Depends(get_storage_backend)):
     """
     Provides the daily content to the client.
 
@@ -19,49 +68,37 @@ async def get_daily_content(version: int = Query(0, description="The current ver
     - If the client's version is outdated, it returns the new content
       along with the latest version number.
     - If no content is found in the storage, it returns a corresponding message.
+
+    Responses carry an ETag derived from the latest version and its GCS
+    generation; a matching If-None-Match gets a 304.
     """
     try:
-        bucket = storage.bucket()
-        # Note: list_blobs can be inefficient for a large number of files.
-        # Consider a more direct way to get the latest version if performance becomes an issue.
-        blobs = bucket.list_blobs(prefix="content/")
-
-        latest_version = 0
-        latest_blob = None
-
-        # This regex finds the version number in filenames like 'daily_content_123.json'
-        version_pattern = re.compile(r"daily_content_(\d+)\.json")
-
-        for blob in blobs:
-            match = version_pattern.search(blob.name)
-            if match:
-                current_version = int(match.group(1))
-                if current_version > latest_version:
-                    latest_version = current_version
-                    latest_blob = blob
-        
+        latest_version, latest_path = await _latest_cache.get(CONTENT_MANIFEST_PATH, lambda: _find_latest_content(storage))
+
         if latest_version == 0:
             return {"status": "no_content_found"}
 
+        if not latest_path:
+            # This case should not be reached if latest_version > 0
+            return {"status": "no_content_found"}
+
+        try:
+            content_json, generation = await _content_cache.get((latest_version, latest_path), lambda: _load_content(storage, latest_path))
+        except json.JSONDecodeError:
+            raise HTTPException(status_code=500, detail="Failed to parse content file.")
+
+        etag = make_etag("content", latest_version, generation)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        response.headers.update(cache_headers(etag))
+
         if version >= latest_version:
             return {"status": "up_to_date"}
         else:
-            if latest_blob:
-                content_str = latest_blob.download_as_text()
-                try:
-                    content_json = json.loads(content_str)
-                    return {
-                        "status": "updated",
-                        "version": latest_version,
-                        "content": content_json
-                    }
-                except json.JSONDecodeError:
-                    raise HTTPException(status_code=500, detail="Failed to parse content file.")
-            else:
-                # This case should not be reached if latest_version > 0
-                return {"status": "no_content_found"}
+            # {"status": "updated", "version": N, "content": ...} around the cached bytes
+            body = b'{"status":"updated","version":%d,"content":%s}' % (latest_version, content_json)
+            return Response(content=body, media_type="application/json", headers=cache_headers(etag))
 
     except Exception as e:
-        # Log the exception for debugging purposes
-        # logger.error(f"Error fetching daily content: {e}")
-        raise HTTPException(status_code=500, detail="An unexpected error occurred.") 
\ No newline at end of file
+        logging.error(f"Error fetching daily content: {e}")
+        raise HTTPException(status_code=500, detail="An unexpected error occurred.")
@@ -1,7 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from app.auth.firebase import verify_firebase_token
-from app.core import get_spotify_client_id, get_spotify_client_secret
-import os
+from app.core import get_spotify_client_id, get_spotify_client_secret, get_spotify_cache_size, get_spotify_cache_ttl, get_spotify_negative_cache_ttl, get_spotify_batch_max_items, get_spotify_batch_concurrency
+from app.cache.ttl_cache import AsyncTTLCache
+from pydantic import BaseModel
+from typing import List
+import asyncio
 import spotipy
 from spotipy.oauth2 import SpotifyClientCredentials
 import logging
@@ -20,10 +23,60 @@ FALLBACK_TRACK = {
     "duration_ms": 480800
 }
 
-def get_spotify_track_info(track_name: str, artist_name: str, market: str = "US") -> dict | None:
+# Process-wide client. Its credentials manager keeps the app token in memory
+# and fetches a new one shortly before it expires, instead of once per request.
+_spotify_client = None
+
+# Normalized (track, artist, market) -> track info, or None when Spotify had
+# no match so FALLBACK_TRACK decisions are cached too (for a shorter time)
+_track_cache = AsyncTTLCache(
+    "spotify_tracks",
+    ttl=get_spotify_cache_ttl(),
+    max_size=get_spotify_cache_size(),
+    ttl_for=lambda track: get_spotify_cache_ttl() if track else get_spotify_negative_cache_ttl(),
+)
+
+def _get_spotify_client() -> spotipy.Spotify:
+    global _spotify_client
+    if _spotify_client is None:
+        _spotify_client = spotipy.Spotify(client_credentials_manager=SpotifyClientCredentials(
+            client_id=get_spotify_client_id(),
+            client_secret=get_spotify_client_secret()
+        ), requests_timeout=10)
+    return _spotify_client
+
+def _normalize(value: str) -> str:
+    return " ".join(value.split()).casefold()
+
+def _search_track(track_name: str, artist_name: str, market: str) -> dict | None:
+    # Blocking HTTP call, run in a worker thread
+    sp = _get_spotify_client()
+
+    # Use filters for more accurate match: note the space between tags
+    q = f'track:{track_name} artist:{artist_name}'
+    results = sp.search(q=q, type="track", market=market, limit=1)
+    items = results.get("tracks", {}).get("items", [])
+
+    if not items:
+        return None
+
+    track = items[0]
+    return {
+        "name": track["name"],
+        "artists": [artist["name"] for artist in track["artists"]],
+        "album": track["album"]["name"],
+        "album_art": track["album"]["images"][0]["url"] if track["album"]["images"] else None,
+        "track_id": track["id"],
+        "spotify_url": track["external_urls"]["spotify"],
+        "preview_url": track.get("preview_url"),
+        "duration_ms": track.get("duration_ms")
+    }
+
+async def get_spotify_track_info(track_name: str, artist_name: str, market: str = "US") -> dict | None:
     """
     Search Spotify for the given track and artist, return a JSON object
     for the top match (limit=1), including its full Spotify URL.
+    Results, including "no match", are served from an in-process cache.
     """
     client_id = get_spotify_client_id()
     client_secret = get_spotify_client_secret()
@@ -31,53 +84,22 @@ def get_spotify_track_info(track_name: str, artist_name: str, market: str = "US"
     if not client_id or not client_secret:
         raise HTTPException(status_code=500, detail="Spotify credentials not configured. Set SPOTIPY_CLIENT_ID and SPOTIPY_CLIENT_SECRET env variables")
 
+    key = (_normalize(track_name), _normalize(artist_name), market.upper())
     try:
-        # Create Spotify client
-        sp = spotipy.Spotify(client_credentials_manager=SpotifyClientCredentials(
-            client_id=client_id,
-            client_secret=client_secret
-        ))
-
-        # Use filters for more accurate match: note the space between tags
-        q = f'track:{track_name} artist:{artist_name}'
-        results = sp.search(q=q, type="track", market=market, limit=1)
-        items = results.get("tracks", {}).get("items", [])
-        
-        if not items:
-            return None
-
-        track = items[0]
-        return {
-            "name": track["name"],
-            "artists": [artist["name"] for artist in track["artists"]],
-            "album": track["album"]["name"],
-            "album_art": track["album"]["images"][0]["url"] if track["album"]["images"] else None,
-            "track_id": track["id"],
-            "spotify_url": track["external_urls"]["spotify"],
-            "preview_url": track.get("preview_url"),
-            "duration_ms": track.get("duration_ms")
-        }
+        return await _track_cache.get(key, lambda: asyncio.to_thread(_search_track, track_name, artist_name, market))
     except Exception as e:
         logging.error(f"Error searching Spotify: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to search Spotify: {str(e)}")
 
-@router.get("/spotify/track")
-async def spotify_song(
-    song_name: str = Query(..., description="The name of the song to search for"),
-    artist_name: str = Query(..., description="The name of the artist"),
-    market: str = Query("US", description="The market (country code) for the search"),
-    user=Depends(verify_firebase_token)
-):
+async def _resolve_track(song_name: str, artist_name: str, market: str) -> dict:
     """
-    Search for a song on Spotify and return track information.
-    
-    This endpoint searches Spotify for a track using the provided song name and artist name.
-    If the track is found, it returns structured track information.
-    If no track is found or if the Spotify API fails, it returns a fallback track.
+    Response body for one lookup: the matched track, or FALLBACK_TRACK when
+    nothing matched or the lookup failed unexpectedly. HTTPExceptions
+    (configuration or Spotify API failures) are raised to the caller.
     """
     try:
         # Search for the track
-        track_info = get_spotify_track_info(song_name, artist_name, market)
+        track_info = await get_spotify_track_info(song_name, artist_name, market)
         
         if track_info:
             logging.info(f"Found Spotify track: {track_info['name']} by {', '.join(track_info['artists'])}")
@@ -108,4 +130,65 @@ async def spotify_song(
             "error": {
                 "message": f"Unexpected error: {str(e)}"
             }
-        } 
\ No newline at end of file
+        }
+
+@router.get("/spotify/track")
+async def spotify_song(
+    song_name: str = Query(..., description="The name of the song to search for"),
+    artist_name: str = Query(..., description="The name of the artist"),
+    market: str = Query("US", description="The market (country code) for the search"),
+    user=Depends(verify_firebase_token)
+):
+    """
+    Search for a song on Spotify and return track information.
+    
+    This endpoint searches Spotify for a track using the provided song name and artist name.
+    If the track is found, it returns structured track information.
+    If no track is found or if the Spotify API fails, it returns a fallback track.
+    """
+    return await _resolve_track(song_name, artist_name, market)
+
+class TrackQuery(BaseModel):
+    song_name: str
+    artist_name: str
+    market: str = "US"
+
+class TrackBatchRequest(BaseModel):
+    tracks: List[TrackQuery]
+
+@router.post("/spotify/tracks")
+async def spotify_songs(payload: TrackBatchRequest, user=Depends(verify_firebase_token)):
+    """
+    Resolve several songs in one request.
+
+    Lookups run concurrently (at most SPOTIFY_BATCH_CONCURRENCY at a time) and
+    results come back in request order, each shaped like a /spotify/track
+    response. A lookup that fails gets FALLBACK_TRACK with an error message
+    instead of failing the whole batch.
+    """
+    if len(payload.tracks) > get_spotify_batch_max_items():
+        raise HTTPException(status_code=400, detail=f"Too many tracks, at most {get_spotify_batch_max_items()} per request")
+    if not get_spotify_client_id() or not get_spotify_client_secret():
+        raise HTTPException(status_code=500, detail="Spotify credentials not configured. Set SPOTIPY_CLIENT_ID and SPOTIPY_CLIENT_SECRET env variables")
+
+    semaphore = asyncio.Semaphore(get_spotify_batch_concurrency())
+
+    async def resolve(query: TrackQuery) -> dict:
+        async with semaphore:
+            try:
+                return await _resolve_track(query.song_name, query.artist_name, query.market)
+            except HTTPException as e:
+                return {
+                    "success": True,
+                    "fallback_used": True,
+                    "track": FALLBACK_TRACK,
+                    "error": {
+                        "message": e.detail
+                    }
+                }
+
+    results = await asyncio.gather(*(resolve(query) for query in payload.tracks))
+    return {
+        "success": True,
+        "results": results
+    }
@@ -1,73 +1,48 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from app.auth.firebase import verify_firebase_token
-from google.cloud import storage
-from app.core import get_firebase_storage_bucket
+from app.storage import get_storage_backend
+from app.http_cache import make_etag, etag_matches, cache_headers, not_modified
+from app.cache.ttl_cache import AsyncTTLCache
 import json
 import logging
-import time
-from typing import Optional, Dict, Any
 
 router = APIRouter()
 
-# In-memory cache for version data
-_version_cache: Optional[Dict[str, Any]] = None
-_last_cache_time: float = 0
-_cache_duration: int = 4 * 60 * 60  # 4 hours in seconds
+VERSION_PATH = "admin/version_control/version.json"
 
-def _is_cache_valid() -> bool:
-    """Check if the cache is still valid (less than 4 hours old)"""
-    return _version_cache is not None and (time.time() - _last_cache_time) < _cache_duration
+# (version_data, generation), refreshed every 4 hours. After that the old
+# value keeps being served for up to a day while one request refreshes it.
+_version_cache = AsyncTTLCache("version", ttl=4 * 60 * 60, stale_ttl=24 * 60 * 60)
 
-def _update_cache(version_data: Dict[str, Any]) -> None:
-    """Update the cache with new version data"""
-    global _version_cache, _last_cache_time
-    _version_cache = version_data
-    _last_cache_time = time.time()
-    logging.info("Version cache updated")
-
-def _get_version_from_storage() -> Dict[str, Any]:
-    """Fetch version data from Firebase Storage"""
-    client = storage.Client()
-    bucket = client.bucket(get_firebase_storage_bucket())
-    
-    # Path to the version.json file in Firebase Storage
-    blob_path = "admin/version_control/version.json"
-    blob = bucket.blob(blob_path)
-    
-    if not blob.exists():
-        logging.error(f"Version file not found at path: {blob_path}")
+async def _get_version_from_storage(storage):
+    """Fetch version data and its generation from Firebase Storage"""
+    version_data, generation = await storage.load_object_json_or_default(VERSION_PATH)
+    if version_data is None:
+        logging.error(f"Version file not found at path: {VERSION_PATH}")
         raise HTTPException(status_code=404, detail="Version file not found")
-    
-    # Download and parse the JSON content
-    content = blob.download_as_string()
-    version_data = json.loads(content)
     logging.info("Version data fetched from Firebase Storage")
-    return version_data
+    return version_data, generation
 
 @router.get("/version")
-async def get_version(user=Depends(verify_firebase_token)):
+async def get_version(request: Request, response: Response, user=Depends(verify_firebase_token), storage=Depends(get_storage_backend)):
     """
     Get the latest app version information from Firebase Storage.
-    Uses in-memory cache with 4-hour sync cycle.
+    Uses a shared in-memory cache with a 4-hour refresh cycle.
+    Supports If-None-Match revalidation against the version file's generation.
     Requires user authentication.
     """
     try:
-        # Check if cache is valid
-        if _is_cache_valid():
-            logging.info(f"Version data served from cache for user {user['uid']}")
-            return _version_cache
-        
-        # Cache is invalid or empty, fetch from storage
-        logging.info("Cache invalid or empty, fetching from Firebase Storage")
-        version_data = _get_version_from_storage()
-        _update_cache(version_data)
-        
-        logging.info(f"Version data retrieved successfully for user {user['uid']}")
+        version_data, generation = await _version_cache.get(VERSION_PATH, lambda: _get_version_from_storage(storage))
+
+        etag = make_etag("version", generation)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        response.headers.update(cache_headers(etag))
         return version_data
-        
+
     except json.JSONDecodeError as e:
         logging.error(f"Invalid JSON in version file: {e}")
         raise HTTPException(status_code=500, detail="Invalid version file format")
     except Exception as e:
         logging.error(f"Error retrieving version data: {e}")
-        raise HTTPException(status_code=500, detail="Failed to retrieve version data") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Failed to retrieve version data")
@@ -1,7 +1,8 @@
 import firebase_admin
-from firebase_admin import auth, credentials
+from firebase_admin import credentials
 from fastapi import HTTPException, status, Request, Depends
 from app.core import get_firebase_project_id, get_firebase_storage_bucket
+from app.auth.token_verifier import get_token_verifier
 import os
 
 # Initialize Firebase Admin SDK
@@ -12,13 +13,14 @@ if not firebase_admin._apps:
         'storageBucket': get_firebase_storage_bucket()
     })
 
-def verify_firebase_token(request: Request):
+async def verify_firebase_token(request: Request):
     auth_header = request.headers.get('Authorization')
     if not auth_header or not auth_header.startswith('Bearer '):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Missing or invalid Authorization header')
     id_token = auth_header.split(' ')[1]
     try:
-        decoded_token = auth.verify_id_token(id_token)
+        # Cached per token until it expires; verification runs off the event loop
+        decoded_token = await get_token_verifier().verify(id_token)
         return {
             'uid': decoded_token['uid'],
             'claims': decoded_token.get('claims', {}),
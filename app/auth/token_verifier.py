@@ -0,0 +1,179 @@
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+import httpx
+from firebase_admin import auth
+from google.auth import jwt
+from app.core import get_firebase_project_id, get_auth_token_cache_size
+
+# Public certificates Firebase uses to sign ID tokens
+FIREBASE_CERTS_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+DEFAULT_CERTS_MAX_AGE = 3600
+MIN_CERTS_REFRESH_INTERVAL = 60
+CLOCK_SKEW_SECONDS = 10
+
+class VerifiedTokenCache:
+    """
+    LRU of already verified ID tokens keyed by their SHA-256, each entry
+    valid until the token's own exp claim.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries = OrderedDict()  # token hash -> (decoded_token, exp)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(id_token: str) -> str:
+        return hashlib.sha256(id_token.encode("utf-8")).hexdigest()
+
+    def get(self, id_token: str) -> Optional[dict]:
+        key = self._key(id_token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            decoded_token, exp = entry
+            if time.time() >= exp:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return decoded_token
+
+    def put(self, id_token: str, decoded_token: dict):
+        exp = decoded_token.get("exp")
+        if not exp:
+            return
+        key = self._key(id_token)
+        with self._lock:
+            self._entries[key] = (decoded_token, exp)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+def _max_age(cache_control: str) -> int:
+    match = re.search(r"max-age=(\d+)", cache_control or "")
+    return int(match.group(1)) if match else DEFAULT_CERTS_MAX_AGE
+
+def _token_key_id(id_token: str) -> Optional[str]:
+    try:
+        header = id_token.split(".")[0]
+        header += "=" * (-len(header) % 4)
+        return json.loads(base64.urlsafe_b64decode(header)).get("kid")
+    except Exception:
+        return None
+
+class PublicCertCache:
+    """
+    Keeps Google's signing certificates in memory and refreshes them in the
+    background shortly before the Cache-Control max-age runs out.
+    """
+
+    def __init__(self, url: str = FIREBASE_CERTS_URL):
+        self.url = url
+        self.certs = {}
+        self.fetched_at = 0.0
+        self._client = None
+        self._task = None
+        self._refresh_lock = asyncio.Lock()
+
+    async def refresh(self) -> int:
+        """Fetch the certificates now and return how long they stay valid."""
+        async with self._refresh_lock:
+            response = await self._client.get(self.url)
+            response.raise_for_status()
+            self.certs = response.json()
+            self.fetched_at = time.time()
+            max_age = _max_age(response.headers.get("cache-control"))
+            logging.info(f"Fetched {len(self.certs)} Firebase signing certificates, max-age {max_age}s")
+            return max_age
+
+    async def _refresh_loop(self, max_age: int):
+        while True:
+            await asyncio.sleep(max(MIN_CERTS_REFRESH_INTERVAL, int(max_age * 0.9)))
+            try:
+                max_age = await self.refresh()
+            except Exception as e:
+                logging.error(f"Failed to refresh Firebase signing certificates: {e}")
+                max_age = MIN_CERTS_REFRESH_INTERVAL
+
+    async def start(self):
+        self._client = httpx.AsyncClient(timeout=10.0)
+        try:
+            max_age = await self.refresh()
+        except Exception as e:
+            # Verification falls back to firebase_admin until a refresh succeeds
+            logging.error(f"Failed to prefetch Firebase signing certificates: {e}")
+            max_age = MIN_CERTS_REFRESH_INTERVAL
+        self._task = asyncio.create_task(self._refresh_loop(max_age))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+class FirebaseTokenVerifier:
+    """
+    Verifies Firebase ID tokens against locally cached certificates, off the
+    event loop, and remembers verified tokens until they expire.
+    """
+
+    def __init__(self, cache_size: int):
+        self.cache = VerifiedTokenCache(cache_size)
+        self.certs = PublicCertCache()
+        self._started = False
+
+    async def start(self):
+        await self.certs.start()
+        self._started = True
+
+    async def stop(self):
+        self._started = False
+        await self.certs.stop()
+
+    def _verify_locally(self, id_token: str, certs: dict) -> dict:
+        project_id = get_firebase_project_id()
+        # Checks the RS256 signature, exp, iat and aud
+        decoded_token = jwt.decode(id_token, certs=certs, audience=project_id, clock_skew_in_seconds=CLOCK_SKEW_SECONDS)
+        if decoded_token.get("iss") != f"https://securetoken.google.com/{project_id}":
+            raise ValueError("Firebase ID token has incorrect issuer")
+        subject = decoded_token.get("sub")
+        if not isinstance(subject, str) or not subject or len(subject) > 128:
+            raise ValueError("Firebase ID token has invalid subject")
+        decoded_token["uid"] = subject
+        return decoded_token
+
+    async def verify(self, id_token: str) -> dict:
+        decoded_token = self.cache.get(id_token)
+        if decoded_token is not None:
+            return decoded_token
+
+        if self._started and self.certs.certs:
+            recently_fetched = time.time() - self.certs.fetched_at < MIN_CERTS_REFRESH_INTERVAL
+            if _token_key_id(id_token) not in self.certs.certs and not recently_fetched:
+                # Keys may have rotated since our last fetch; throttled so
+                # bogus key ids can't force a fetch per request
+                await self.certs.refresh()
+            decoded_token = await asyncio.to_thread(self._verify_locally, id_token, self.certs.certs)
+        else:
+            decoded_token = await asyncio.to_thread(auth.verify_id_token, id_token)
+        self.cache.put(id_token, decoded_token)
+        return decoded_token
+
+_token_verifier = None
+
+def get_token_verifier() -> FirebaseTokenVerifier:
+    global _token_verifier
+    if _token_verifier is None:
+        _token_verifier = FirebaseTokenVerifier(get_auth_token_cache_size())
+    return _token_verifier
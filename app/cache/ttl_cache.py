@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import random
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+# Every cache registers itself here so stats can be reported in one place
+_caches = []
+
+def cache_stats() -> dict:
+    return {cache.name: cache.stats() for cache in _caches}
+
+class _Entry:
+    __slots__ = ("value", "fresh_until", "stale_until")
+
+    def __init__(self, value, fresh_until: float, stale_until: float):
+        self.value = value
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+
+class AsyncTTLCache:
+    """
+    In-process cache for read-mostly data shared by concurrent requests.
+
+    - Single-flight: concurrent misses for a key share one loader call.
+    - Stale-while-revalidate: for stale_ttl seconds after an entry expires it
+      is still served while one background refresh replaces it. A failed
+      refresh keeps the old value.
+    - TTLs are per key (ttl argument or ttl_for(value)) with random jitter so
+      entries loaded together don't all expire together.
+    - Optional max_size turns it into an LRU.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float,
+        stale_ttl: float = 0,
+        jitter: float = 0.1,
+        max_size: Optional[int] = None,
+        ttl_for: Optional[Callable[[Any], float]] = None,
+    ):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.jitter = jitter
+        self.max_size = max_size
+        self.ttl_for = ttl_for
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._metrics = {"hits": 0, "stale_hits": 0, "misses": 0, "loads": 0, "load_errors": 0, "evictions": 0}
+        _caches.append(self)
+
+    def stats(self) -> dict:
+        return {**self._metrics, "size": len(self._entries)}
+
+    def _jittered(self, ttl: float) -> float:
+        return ttl * (1 + random.uniform(-self.jitter, self.jitter)) if self.jitter else ttl
+
+    def set(self, key: Hashable, value, ttl: Optional[float] = None):
+        if ttl is None:
+            ttl = self.ttl_for(value) if self.ttl_for else self.ttl
+        fresh_until = time.monotonic() + self._jittered(ttl)
+        self._entries[key] = _Entry(value, fresh_until, fresh_until + self.stale_ttl)
+        self._entries.move_to_end(key)
+        if self.max_size is not None:
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._metrics["evictions"] += 1
+
+    def invalidate(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    async def _run_loader(self, key, loader, ttl):
+        self._metrics["loads"] += 1
+        try:
+            value = await loader()
+        except Exception:
+            self._metrics["load_errors"] += 1
+            raise
+        self.set(key, value, ttl)
+        return value
+
+    def _start_load(self, key, loader, ttl) -> asyncio.Future:
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._run_loader(key, loader, ttl))
+            self._inflight[key] = future
+
+            def _done(done_future):
+                self._inflight.pop(key, None)
+                # Mark the error as retrieved even if every waiter went away
+                if not done_future.cancelled() and done_future.exception() is not None:
+                    logging.warning(f"Cache {self.name} failed to load {key!r}: {done_future.exception()}")
+
+            future.add_done_callback(_done)
+        return future
+
+    async def get(self, key: Hashable, loader: Callable[[], Awaitable[Any]], ttl: Optional[float] = None):
+        """Return the cached value for key, calling loader() on a miss."""
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None:
+            if now < entry.fresh_until:
+                self._metrics["hits"] += 1
+                self._entries.move_to_end(key)
+                return entry.value
+            if now < entry.stale_until:
+                self._metrics["stale_hits"] += 1
+                self._entries.move_to_end(key)
+                self._start_load(key, loader, ttl)
+                return entry.value
+        self._metrics["misses"] += 1
+        # Shielded so one cancelled request doesn't cancel the load others wait on
+        return await asyncio.shield(self._start_load(key, loader, ttl))
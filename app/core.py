@@ -32,3 +32,136 @@ def get_spotify_client_id():
 
 def get_spotify_client_secret():
     return os.environ.get("SPOTIFY_CLIENT_SECRET")
+
+def get_storage_http_pool_size():
+    return int(os.environ.get("STORAGE_HTTP_POOL_SIZE", "32"))
+
+def get_storage_max_concurrency():
+    return int(os.environ.get("STORAGE_MAX_CONCURRENCY", "32"))
+
+def get_rate_limit_counter_store():
+    # "gcs" (shared across instances) or "memory" (single instance / tests)
+    return os.environ.get("RATE_LIMIT_COUNTER_STORE", "gcs")
+
+def get_rate_limit_usage_window_days():
+    return int(os.environ.get("RATE_LIMIT_USAGE_WINDOW_DAYS", "7"))
+
+def get_rate_limit_archive_usage():
+    return os.environ.get("RATE_LIMIT_ARCHIVE_USAGE", "true").lower() == "true"
+
+def get_chat_fast_token_estimate():
+    return os.environ.get("CHAT_FAST_TOKEN_ESTIMATE", "true").lower() == "true"
+
+def get_openai_api_base():
+    # Point at a local stand-in server for testing
+    return os.environ.get("OPENAI_API_BASE", "https://api.openai.com/v1")
+
+def get_openai_http2():
+    return os.environ.get("OPENAI_HTTP2", "true").lower() == "true"
+
+def get_openai_max_connections():
+    return int(os.environ.get("OPENAI_MAX_CONNECTIONS", "100"))
+
+def get_openai_max_keepalive_connections():
+    return int(os.environ.get("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20"))
+
+def get_openai_keepalive_expiry():
+    return float(os.environ.get("OPENAI_KEEPALIVE_EXPIRY", "60"))
+
+def get_openai_connect_timeout():
+    return float(os.environ.get("OPENAI_CONNECT_TIMEOUT", "5"))
+
+def get_openai_read_timeout():
+    return float(os.environ.get("OPENAI_READ_TIMEOUT", "60"))
+
+def get_openai_fallback_chat_model():
+    return os.environ.get("OPENAI_FALLBACK_CHAT_MODEL", "gpt-3.5-turbo")
+
+def get_openai_hedge_after_seconds():
+    # 0 disables hedging: the fallback model only runs after a retryable failure
+    return float(os.environ.get("OPENAI_HEDGE_AFTER_SECONDS", "0"))
+
+def get_auth_token_cache_size():
+    return int(os.environ.get("AUTH_TOKEN_CACHE_SIZE", "10000"))
+
+def get_content_index_refresh_seconds():
+    return int(os.environ.get("CONTENT_INDEX_REFRESH_SECONDS", "300"))
+
+def get_http_cache_max_age():
+    # How long clients may reuse /version and /content/daily before revalidating
+    return int(os.environ.get("HTTP_CACHE_MAX_AGE", "300"))
+
+def get_spotify_cache_size():
+    return int(os.environ.get("SPOTIFY_CACHE_SIZE", "5000"))
+
+def get_spotify_cache_ttl():
+    return int(os.environ.get("SPOTIFY_CACHE_TTL", str(24 * 60 * 60)))
+
+def get_spotify_negative_cache_ttl():
+    # "No match" answers are cached for less time than real tracks
+    return int(os.environ.get("SPOTIFY_NEGATIVE_CACHE_TTL", str(60 * 60)))
+
+def get_spotify_batch_max_items():
+    return int(os.environ.get("SPOTIFY_BATCH_MAX_ITEMS", "50"))
+
+def get_spotify_batch_concurrency():
+    return int(os.environ.get("SPOTIFY_BATCH_CONCURRENCY", "5"))
+
+def get_full_backup_chunked():
+    return os.environ.get("FULL_BACKUP_CHUNKED", "true").lower() == "true"
+
+def get_storage_stream_chunk_size():
+    return int(os.environ.get("STORAGE_STREAM_CHUNK_SIZE", str(256 * 1024)))
+
+def get_full_backup_retention_count():
+    # 0 keeps every backup
+    return int(os.environ.get("FULL_BACKUP_RETENTION_COUNT", "0"))
+
+def get_full_backup_retention_days():
+    # 0 keeps backups regardless of age
+    return int(os.environ.get("FULL_BACKUP_RETENTION_DAYS", "0"))
+
+def get_full_backup_max_bytes():
+    return int(os.environ.get("FULL_BACKUP_MAX_BYTES", str(100 * 1024 * 1024)))
+
+def get_full_backup_stream_min_bytes():
+    # Uploads at least this large are streamed to storage as one document
+    # instead of being parsed and chunked
+    return int(os.environ.get("FULL_BACKUP_STREAM_MIN_BYTES", str(8 * 1024 * 1024)))
+
+def get_storage_upload_chunk_size():
+    # Resumable upload chunks must be a multiple of 256 KiB
+    return int(os.environ.get("STORAGE_UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+def get_storage_write_behind_seconds():
+    # 0 writes settings/account saves through before responding
+    return float(os.environ.get("STORAGE_WRITE_BEHIND_SECONDS", "0"))
+
+def get_summary_batch_max_items():
+    return int(os.environ.get("SUMMARY_BATCH_MAX_ITEMS", "100"))
+
+def get_summary_batch_max_bytes():
+    # Applies to the decompressed body as well
+    return int(os.environ.get("SUMMARY_BATCH_MAX_BYTES", str(8 * 1024 * 1024)))
+
+def get_summary_batch_concurrency():
+    return int(os.environ.get("SUMMARY_BATCH_CONCURRENCY", "8"))
+
+def get_summary_range_max_days():
+    return int(os.environ.get("SUMMARY_RANGE_MAX_DAYS", "366"))
+
+def get_summary_packs_enabled():
+    return os.environ.get("SUMMARY_PACKS_ENABLED", "true").lower() == "true"
+
+def get_crash_flush_seconds():
+    return float(os.environ.get("CRASH_FLUSH_SECONDS", "30"))
+
+def get_crash_segment_max_bytes():
+    # Buffered sample size that triggers an early flush
+    return int(os.environ.get("CRASH_SEGMENT_MAX_BYTES", str(1024 * 1024)))
+
+def get_crash_max_groups():
+    return int(os.environ.get("CRASH_MAX_GROUPS", "1000"))
+
+def get_crash_samples_per_group():
+    return int(os.environ.get("CRASH_SAMPLES_PER_GROUP", "3"))
@@ -0,0 +1,192 @@
+import asyncio
+import hashlib
+import logging
+import re
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Optional
+from app.core import get_crash_flush_seconds, get_crash_segment_max_bytes, get_crash_max_groups, get_crash_samples_per_group
+from app.serialization import dumps
+from app.storage import get_storage_backend
+
+SEGMENTS_PREFIX = "crash_reports"
+MAX_USERS_PER_GROUP = 50
+# Addresses and object ids differ between otherwise identical crashes
+_VOLATILE = re.compile(r"0x[0-9a-fA-F]+|@[0-9a-fA-F]{6,}|\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b")
+
+def crash_fingerprint(error: str, stack_trace: str, app_version: Optional[str]) -> str:
+    normalized = _VOLATILE.sub("_", stack_trace)
+    normalized = "\n".join(line.strip() for line in normalized.splitlines() if line.strip())
+    first_error_line = (error.splitlines() or [""])[0]
+    key = f"{app_version or ''}\n{_VOLATILE.sub('_', first_error_line)}\n{normalized}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+class _CrashGroup:
+    __slots__ = ("fingerprint", "error", "stack_trace", "app_version", "count", "first_seen", "last_seen", "users", "samples", "size")
+
+    def __init__(self, fingerprint: str, report: dict, seen_at: str):
+        self.fingerprint = fingerprint
+        self.error = report.get("error")
+        self.stack_trace = report.get("stackTrace")
+        self.app_version = report.get("appVersion")
+        self.count = 0
+        self.first_seen = seen_at
+        self.last_seen = seen_at
+        self.users = []
+        self.samples = []
+        self.resize()
+
+    def resize(self):
+        """Recompute the buffered size: the trace text plus each sample's JSON."""
+        self.size = len(self.error or "") + len(self.stack_trace or "") + sum(len(dumps(sample)) for sample in self.samples)
+
+    def to_json(self) -> dict:
+        return {
+            "fingerprint": self.fingerprint,
+            "error": self.error,
+            "stackTrace": self.stack_trace,
+            "appVersion": self.app_version,
+            "count": self.count,
+            "firstSeen": self.first_seen,
+            "lastSeen": self.last_seen,
+            "users": self.users,
+            "samples": self.samples,
+        }
+
+class CrashIngestQueue:
+    """
+    Buffers crash reports in memory and writes them out in batches.
+
+    Reports are grouped by a fingerprint of their (normalized) stack trace,
+    so a crash storm from one bug becomes a single group with a count, a
+    few sample reports and the affected users. Groups are written as one
+    NDJSON segment to crash_reports/{date}/ every flush_seconds, or sooner
+    once the buffered samples reach max_bytes.
+
+    Memory is bounded by max_groups and samples_per_group; reports that
+    don't fit are dropped and counted in stats() rather than blocking the
+    request.
+    """
+
+    def __init__(self, storage=None, flush_seconds: float = 30, max_bytes: int = 1024 * 1024, max_groups: int = 1000, samples_per_group: int = 3):
+        self._storage = storage
+        self.flush_seconds = flush_seconds
+        self.max_bytes = max_bytes
+        self.max_groups = max_groups
+        self.samples_per_group = samples_per_group
+        self._groups = OrderedDict()  # fingerprint -> _CrashGroup
+        self._buffered_bytes = 0
+        self._flush_requested = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+        self._metrics = {"received": 0, "written": 0, "segments": 0, "dropped_full": 0, "dropped_flush_errors": 0, "flush_errors": 0}
+
+    @property
+    def storage(self):
+        return self._storage or get_storage_backend()
+
+    def stats(self) -> dict:
+        return {**self._metrics, "groups": len(self._groups), "buffered_bytes": self._buffered_bytes}
+
+    def add(self, user_id: str, report: dict) -> bool:
+        """Queue a report. Returns False when it was dropped because the buffer is full."""
+        self._metrics["received"] += 1
+        fingerprint = crash_fingerprint(report.get("error") or "", report.get("stackTrace") or "", report.get("appVersion"))
+        seen_at = datetime.now(timezone.utc).isoformat()
+        group = self._groups.get(fingerprint)
+        if group is None:
+            if len(self._groups) >= self.max_groups:
+                self._metrics["dropped_full"] += 1
+                return False
+            group = self._groups[fingerprint] = _CrashGroup(fingerprint, report, seen_at)
+            self._buffered_bytes += group.size
+        group.count += 1
+        group.last_seen = seen_at
+        if user_id not in group.users and len(group.users) < MAX_USERS_PER_GROUP:
+            group.users.append(user_id)
+        if len(group.samples) < self.samples_per_group:
+            sample = {"userId": user_id, "receivedAt": seen_at, **report}
+            sample_size = len(dumps(sample))
+            group.samples.append(sample)
+            group.size += sample_size
+            self._buffered_bytes += sample_size
+        if self._buffered_bytes >= self.max_bytes:
+            self._flush_requested.set()
+        return True
+
+    def _restore(self, groups: list):
+        """Put back groups from a failed flush, merging with anything queued since."""
+        for group in groups:
+            current = self._groups.get(group.fingerprint)
+            if current is None:
+                if len(self._groups) >= self.max_groups:
+                    self._metrics["dropped_flush_errors"] += group.count
+                    continue
+                self._groups[group.fingerprint] = group
+                self._buffered_bytes += group.size
+                continue
+            current.count += group.count
+            current.first_seen = min(current.first_seen, group.first_seen)
+            current.users = (group.users + [user for user in current.users if user not in group.users])[:MAX_USERS_PER_GROUP]
+            current.samples = (group.samples + current.samples)[:self.samples_per_group]
+            self._buffered_bytes -= current.size
+            current.resize()
+            self._buffered_bytes += current.size
+
+    async def flush(self):
+        """Write everything buffered as one segment."""
+        async with self._flush_lock:
+            self._flush_requested.clear()
+            if not self._groups:
+                return
+            groups = list(self._groups.values())
+            self._groups = OrderedDict()
+            self._buffered_bytes = 0
+            now = datetime.now(timezone.utc)
+            path = f"{SEGMENTS_PREFIX}/{now.strftime('%Y-%m-%d')}/segment_{now.strftime('%Y-%m-%dT%H-%M-%S')}_{uuid.uuid4()}.ndjson"
+            payload = b"".join(dumps(group.to_json()) + b"\n" for group in groups)
+            try:
+                await self.storage.save_object_bytes(path, payload, "application/x-ndjson")
+            except Exception as e:
+                self._metrics["flush_errors"] += 1
+                logging.error(f"Failed to write crash segment {path}: {e}")
+                self._restore(groups)
+                return
+            reports = sum(group.count for group in groups)
+            self._metrics["written"] += reports
+            self._metrics["segments"] += 1
+            logging.info(f"Wrote {reports} crash reports in {len(groups)} groups to {path}")
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            # Shielded so stop() can't cancel a segment write half way
+            await asyncio.shield(self.flush())
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+        logging.info(f"Crash ingest stats: {self.stats()}")
+
+_crash_queue = None
+
+def get_crash_queue() -> CrashIngestQueue:
+    global _crash_queue
+    if _crash_queue is None:
+        _crash_queue = CrashIngestQueue(
+            flush_seconds=get_crash_flush_seconds(),
+            max_bytes=get_crash_segment_max_bytes(),
+            max_groups=get_crash_max_groups(),
+            samples_per_group=get_crash_samples_per_group(),
+        )
+    return _crash_queue
@@ -0,0 +1,26 @@
+from fastapi import Request, Response
+from app.core import get_http_cache_max_age
+
+def make_etag(*parts) -> str:
+    """Strong ETag built from validators such as GCS object generations."""
+    return '"' + "-".join(str(part) for part in parts) + '"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison, so ignore a W/ prefix
+    candidates = [value.strip().removeprefix("W/") for value in if_none_match.split(",")]
+    return etag in candidates
+
+def cache_headers(etag: str) -> dict:
+    # Responses are per authenticated user, so only the client may store them
+    return {
+        "ETag": etag,
+        "Cache-Control": f"private, max-age={get_http_cache_max_age()}, must-revalidate",
+    }
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag))
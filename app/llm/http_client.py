@@ -0,0 +1,51 @@
+import logging
+import httpx
+from app.core import (
+    get_openai_api_base,
+    get_openai_http2,
+    get_openai_max_connections,
+    get_openai_max_keepalive_connections,
+    get_openai_keepalive_expiry,
+    get_openai_connect_timeout,
+    get_openai_read_timeout,
+)
+
+# App-scoped client for the OpenAI API; created in the FastAPI lifespan
+_http_client = None
+
+def create_http_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=get_openai_max_connections(),
+        max_keepalive_connections=get_openai_max_keepalive_connections(),
+        keepalive_expiry=get_openai_keepalive_expiry(),
+    )
+    timeout = httpx.Timeout(
+        connect=get_openai_connect_timeout(),
+        read=get_openai_read_timeout(),
+        write=get_openai_read_timeout(),
+        pool=get_openai_connect_timeout(),
+    )
+    http2 = get_openai_http2()
+    try:
+        return httpx.AsyncClient(base_url=get_openai_api_base(), http2=http2, limits=limits, timeout=timeout)
+    except ImportError:
+        # http2=True needs the optional h2 package (httpx[http2])
+        logging.warning("h2 is not installed, OpenAI client falls back to HTTP/1.1")
+        return httpx.AsyncClient(base_url=get_openai_api_base(), limits=limits, timeout=timeout)
+
+def init_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None:
+        _http_client = create_http_client()
+    return _http_client
+
+def get_http_client() -> httpx.AsyncClient:
+    if _http_client is None:
+        return init_http_client()
+    return _http_client
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
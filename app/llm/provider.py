@@ -1,24 +1,77 @@
 from abc import ABC, abstractmethod
+from typing import AsyncIterator
 from app.core import get_openai_api_key
-import openai
+from app.llm.http_client import get_http_client
+from app.serialization import loads
+
+class LLMProviderError(Exception):
+    """Non-success response from the upstream LLM API."""
+
+    def __init__(self, status_code: int, body: str):
+        super().__init__(f"{status_code}: {body}")
+        self.status_code = status_code
+        self.body = body
 
 class LLMProvider(ABC):
     @abstractmethod
-    def chat(self, messages: list, **kwargs) -> dict:
+    async def chat(self, messages: list, **kwargs) -> dict:
+        pass
+
+    @abstractmethod
+    def stream_chat(self, messages: list, **kwargs) -> AsyncIterator[dict]:
         pass
 
 class OpenAIProvider(LLMProvider):
-    def __init__(self):
-        openai.api_key = get_openai_api_key()
+    def __init__(self, client=None):
+        self._client = client
+
+    @property
+    def client(self):
+        return self._client or get_http_client()
+
+    def _headers(self) -> dict:
+        return {
+            "Authorization": f"Bearer {get_openai_api_key()}",
+            "Content-Type": "application/json"
+        }
+
+    def _payload(self, messages: list, kwargs: dict) -> dict:
+        payload = {
+            "model": kwargs.get('model', 'gpt-3.5-turbo'),
+            "messages": messages,
+            "max_tokens": kwargs.get('max_tokens', 1000),
+        }
+        if 'temperature' in kwargs:
+            payload["temperature"] = kwargs['temperature']
+        return payload
+
+    async def chat(self, messages: list, **kwargs) -> dict:
+        payload = self._payload(messages, kwargs)
+        response = await self.client.post("/chat/completions", headers=self._headers(), json=payload)
+        if response.status_code != 200:
+            raise LLMProviderError(response.status_code, response.text)
+        return loads(response.content)
 
-    def chat(self, messages: list, **kwargs) -> dict:
-        response = openai.ChatCompletion.create(
-            model=kwargs.get('model', 'gpt-3.5-turbo'),
-            messages=messages,
-            max_tokens=kwargs.get('max_tokens', 1000),
-        )
-        return response
+    async def stream_chat(self, messages: list, **kwargs) -> AsyncIterator[dict]:
+        """
+        Yield completion chunks as OpenAI streams them. The last chunk carries
+        usage (stream_options.include_usage) and an empty choices list.
+        """
+        payload = self._payload(messages, kwargs)
+        payload["stream"] = True
+        payload["stream_options"] = {"include_usage": True}
+        async with self.client.stream("POST", "/chat/completions", headers=self._headers(), json=payload) as response:
+            if response.status_code != 200:
+                body = (await response.aread()).decode("utf-8", errors="replace")
+                raise LLMProviderError(response.status_code, body)
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                yield loads(data)
 
 def get_llm_provider():
     # In the future, swap based on config
-    return OpenAIProvider() 
\ No newline at end of file
+    return OpenAIProvider()
@@ -0,0 +1,86 @@
+import asyncio
+import logging
+import httpx
+from app.core import get_openai_chat_model, get_openai_fallback_chat_model, get_openai_hedge_after_seconds
+from app.llm.provider import LLMProviderError
+
+# Upstream statuses worth retrying on another model; 4xx like 400/401 would fail there too
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, LLMProviderError):
+        return error.status_code in RETRYABLE_STATUS_CODES or error.status_code >= 500
+    # Timeouts, connection resets, protocol errors
+    return isinstance(error, httpx.TransportError)
+
+class ModelRouter:
+    """
+    Runs a model call against the primary model and falls back to the
+    secondary one only for retryable upstream failures. With hedge_after set,
+    the fallback is also started when the primary has not answered within
+    that many seconds, and whichever succeeds first wins.
+    """
+
+    def __init__(self, primary: str, fallback: str, hedge_after: float = 0):
+        self.primary = primary
+        self.fallback = fallback
+        self.hedge_after = hedge_after
+
+    async def route(self, call, discard=None):
+        """
+        call(model) is an awaitable factory for one upstream attempt. Returns
+        (result, model). discard(result) cleans up the result of a hedged
+        attempt that finished but lost the race (e.g. closes an open stream).
+        """
+        primary = asyncio.create_task(call(self.primary))
+        pending = {primary}
+        fallback = None
+        if self.hedge_after > 0 and self.fallback != self.primary:
+            done, _ = await asyncio.wait(pending, timeout=self.hedge_after)
+            if not done:
+                logging.info(f"Primary model {self.primary} slower than {self.hedge_after}s, hedging with {self.fallback}")
+                fallback = asyncio.create_task(call(self.fallback))
+                pending.add(fallback)
+
+        errors = []
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                succeeded = [task for task in done if task.exception() is None]
+                if succeeded:
+                    winner = succeeded[0]
+                    for task in succeeded[1:]:
+                        if discard:
+                            await discard(task.result())
+                    return winner.result(), (self.primary if winner is primary else self.fallback)
+                for task in done:
+                    error = task.exception()
+                    errors.append(error)
+                    if not is_retryable(error):
+                        raise error
+                    model = self.primary if task is primary else self.fallback
+                    logging.warning(f"Model {model} failed with retryable error: {error}")
+                    if fallback is None and self.fallback != self.primary:
+                        fallback = asyncio.create_task(call(self.fallback))
+                        pending.add(fallback)
+            raise errors[-1]
+        finally:
+            # Cancel the losing attempt; one that finished anyway still gets cleaned up
+            for task in pending:
+                task.cancel()
+            for task in pending:
+                try:
+                    result = await task
+                except asyncio.CancelledError:
+                    # Only the attempt's own cancellation is expected here;
+                    # if route() itself is being cancelled, let that through
+                    if asyncio.current_task().cancelling():
+                        raise
+                    continue
+                except Exception:
+                    continue
+                if discard:
+                    await discard(result)
+
+def get_model_router():
+    return ModelRouter(get_openai_chat_model(), get_openai_fallback_chat_model(), get_openai_hedge_after_seconds())
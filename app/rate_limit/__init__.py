@@ -1 +1,14 @@
- 
\ No newline at end of file
+from app.core import get_rate_limit_counter_store
+from app.rate_limit.counter_store import CounterStore, GCSCounterStore, InMemoryCounterStore
+
+# Process-wide counter store; the GCS store keeps a small cache of known generations
+_counter_store = None
+
+def get_counter_store() -> CounterStore:
+    global _counter_store
+    if _counter_store is None:
+        if get_rate_limit_counter_store() == "memory":
+            _counter_store = InMemoryCounterStore()
+        else:
+            _counter_store = GCSCounterStore()
+    return _counter_store
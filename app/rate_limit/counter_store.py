@@ -0,0 +1,192 @@
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+from app.core import get_rate_limit_archive_usage, get_rate_limit_usage_window_days
+from app.storage import get_storage_backend
+from app.storage.base import StorageConflictError
+from app.rate_limit.usage_window import compact_usage_data, normalize_usage_data, rollup_by_month
+
+def _empty_usage():
+    return {'messages': 0, 'tokens': 0}
+
+@dataclass
+class Reservation:
+    """
+    Result of check_and_reserve. When allowed, one message slot is already
+    counted and must be finalized with commit() or returned with release().
+    """
+    user_id: str
+    day: str
+    allowed: bool
+    usage: dict
+    # Store-specific state carried from the reserve write to commit/release
+    data: Optional[dict] = field(default=None, repr=False)
+    generation: Optional[int] = None
+
+class CounterStore(ABC):
+    @abstractmethod
+    async def check_and_reserve(self, user_id: str, day: str, message_limit: int) -> Reservation: ...
+
+    @abstractmethod
+    async def commit(self, reservation: Reservation, tokens: int) -> dict: ...
+
+    @abstractmethod
+    async def release(self, reservation: Reservation): ...
+
+    @abstractmethod
+    async def get_usage(self, user_id: str, day: str) -> dict: ...
+
+class InMemoryCounterStore(CounterStore):
+    """Process-local counters. Correct for a single instance and for tests."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._usage = {}  # user_id -> (day, usage)
+
+    def _current(self, user_id: str, day: str) -> dict:
+        stored_day, usage = self._usage.get(user_id, (None, None))
+        if stored_day != day:
+            usage = _empty_usage()
+            self._usage[user_id] = (day, usage)
+        return usage
+
+    async def check_and_reserve(self, user_id: str, day: str, message_limit: int) -> Reservation:
+        with self._lock:
+            usage = self._current(user_id, day)
+            if usage['messages'] >= message_limit:
+                return Reservation(user_id, day, False, dict(usage))
+            usage['messages'] += 1
+            return Reservation(user_id, day, True, dict(usage))
+
+    async def commit(self, reservation: Reservation, tokens: int) -> dict:
+        with self._lock:
+            usage = self._current(reservation.user_id, reservation.day)
+            usage['tokens'] += tokens
+            return dict(usage)
+
+    async def release(self, reservation: Reservation):
+        with self._lock:
+            usage = self._current(reservation.user_id, reservation.day)
+            usage['messages'] = max(0, usage['messages'] - 1)
+
+    async def get_usage(self, user_id: str, day: str) -> dict:
+        with self._lock:
+            return dict(self._current(user_id, day))
+
+class GCSCounterStore(CounterStore):
+    """
+    Counters kept in the user's chatAILimiter.json and updated with
+    generation-match (compare-and-swap) writes, so concurrent requests on any
+    instance never lose increments.
+
+    The last written (data, generation) per user is remembered in a bounded
+    LRU, which lets the common case skip the read and go straight to a single
+    conditional write. A stale entry just costs one conflict and a re-read.
+
+    Only a rolling window of days is kept in the file, so its size stays
+    constant. Days leaving the window are added to per-month totals in a
+    separate archive object. Legacy files are migrated on their next write.
+    """
+
+    path = 'chatAILimiter.json'
+    archive_path = 'chatAILimiterArchive.json'
+
+    def __init__(self, storage=None, max_attempts: int = 5, cache_size: int = 10000):
+        self._storage = storage
+        self.max_attempts = max_attempts
+        self.cache_size = cache_size
+        self._known = OrderedDict()  # user_id -> (data, generation)
+
+    @property
+    def storage(self):
+        return self._storage or get_storage_backend()
+
+    def _remember(self, user_id: str, data: dict, generation: int):
+        self._known[user_id] = (data, generation)
+        self._known.move_to_end(user_id)
+        while len(self._known) > self.cache_size:
+            self._known.popitem(last=False)
+
+    async def _load(self, user_id: str):
+        data, generation = await self.storage.load_json_or_default(user_id, self.path, {})
+        data = normalize_usage_data(data)
+        self._remember(user_id, data, generation)
+        return data, generation
+
+    async def _archive(self, user_id: str, evicted: dict):
+        """Fold evicted days into the monthly archive. Best effort, off the limiter file."""
+        rollup = rollup_by_month(evicted)
+        try:
+            for _ in range(self.max_attempts):
+                archive, generation = await self.storage.load_json_or_default(user_id, self.archive_path, {})
+                for month, usage in rollup.items():
+                    total = archive.setdefault(month, {'messages': 0, 'tokens': 0})
+                    total['messages'] += usage['messages']
+                    total['tokens'] += usage['tokens']
+                try:
+                    await self.storage.save_json(user_id, self.archive_path, archive, if_generation_match=generation)
+                    return
+                except StorageConflictError:
+                    continue
+            logging.error(f"Gave up archiving limiter usage for user {user_id}: {rollup}")
+        except Exception as e:
+            logging.error(f"Failed to archive limiter usage for user {user_id}: {e}")
+
+    async def _update(self, user_id: str, day: str, mutate, data=None, generation=None):
+        """
+        Apply mutate(usage) to the day's entry and write it back conditionally,
+        re-reading on conflict. mutate returns False to abort without writing.
+        Returns (written, usage, data, generation).
+        """
+        if data is None:
+            cached = self._known.get(user_id)
+            data, generation = cached if cached else await self._load(user_id)
+        for attempt in range(self.max_attempts):
+            # Work on a copy so a lost race never leaks into the cached state
+            new_data, evicted = compact_usage_data(data, day, get_rate_limit_usage_window_days())
+            new_data["days"] = {key: dict(value) for key, value in new_data["days"].items()}
+            usage = new_data["days"].setdefault(day, _empty_usage())
+            if mutate(usage) is False:
+                return False, usage, data, generation
+            try:
+                new_generation = await self.storage.save_json(user_id, self.path, new_data, if_generation_match=generation)
+            except StorageConflictError:
+                logging.info(f"Rate limit counter conflict for user {user_id} (attempt {attempt + 1})")
+                data, generation = await self._load(user_id)
+                continue
+            self._remember(user_id, new_data, new_generation)
+            # Our conditional write is the one that removed these days, so
+            # they are archived exactly once
+            if evicted and get_rate_limit_archive_usage():
+                await self._archive(user_id, evicted)
+            return True, usage, new_data, new_generation
+        raise StorageConflictError(f"Could not update rate limit counters for user {user_id}")
+
+    async def check_and_reserve(self, user_id: str, day: str, message_limit: int) -> Reservation:
+        def reserve(usage):
+            if usage['messages'] >= message_limit:
+                return False
+            usage['messages'] += 1
+
+        written, usage, data, generation = await self._update(user_id, day, reserve)
+        return Reservation(user_id, day, written, dict(usage), data, generation)
+
+    async def commit(self, reservation: Reservation, tokens: int) -> dict:
+        def add_tokens(usage):
+            usage['tokens'] += tokens
+
+        _, usage, _, _ = await self._update(reservation.user_id, reservation.day, add_tokens, reservation.data, reservation.generation)
+        return dict(usage)
+
+    async def release(self, reservation: Reservation):
+        def give_back(usage):
+            usage['messages'] = max(0, usage['messages'] - 1)
+
+        await self._update(reservation.user_id, reservation.day, give_back, reservation.data, reservation.generation)
+
+    async def get_usage(self, user_id: str, day: str) -> dict:
+        data, _ = await self._load(user_id)
+        return dict(data["days"].get(day, _empty_usage()))
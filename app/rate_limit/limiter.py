@@ -1,34 +1,50 @@
 import datetime
-from app.storage import get_storage_backend
+import logging
+from app.rate_limit import get_counter_store
 from app.core import get_rate_limit_chat_messages_per_day, get_rate_limit_chat_tokens_per_request
 
 class RateLimiter:
-    def __init__(self, user_id: str):
+    """
+    Per-request view of a user's chat limits. A message slot is reserved
+    atomically before the upstream call and then either committed with the
+    real token count or released if the call fails.
+    """
+
+    def __init__(self, user_id: str, store=None):
         self.user_id = user_id
-        self.storage = get_storage_backend()
+        self.store = store or get_counter_store()
         self.today = datetime.date.today().isoformat()
-        self.chat_ai_path = 'chatAILimiter.json'
-
-    def _get_usage(self):
-        if self.storage.file_exists(self.user_id, self.chat_ai_path):
-            data = self.storage.load_json(self.user_id, self.chat_ai_path)
-            return data.get(self.today, {'messages': 0, 'tokens': 0})
-        return {'messages': 0, 'tokens': 0}
+        self._reservation = None
 
-    def increment(self, tokens: int):
-        data = {}
-        if self.storage.file_exists(self.user_id, self.chat_ai_path):
-            data = self.storage.load_json(self.user_id, self.chat_ai_path)
-        usage = data.get(self.today, {'messages': 0, 'tokens': 0})
-        usage['messages'] += 1
-        usage['tokens'] += tokens
-        data[self.today] = usage
-        self.storage.save_json(self.user_id, self.chat_ai_path, data)
-
-    def check(self, tokens: int):
-        usage = self._get_usage()
-        if usage['messages'] >= get_rate_limit_chat_messages_per_day():
-            return False, '[Backend] Daily message limit reached'
+    async def check_and_reserve(self, tokens: int):
+        # Per-request token limit needs no stored state, check it first
         if tokens > get_rate_limit_chat_tokens_per_request():
             return False, f'[Backend] Token limit per request exceeded: {tokens} tokens used, limit is {get_rate_limit_chat_tokens_per_request()}'
-        return True, '' 
\ No newline at end of file
+        reservation = await self.store.check_and_reserve(self.user_id, self.today, get_rate_limit_chat_messages_per_day())
+        if not reservation.allowed:
+            return False, '[Backend] Daily message limit reached'
+        self._reservation = reservation
+        return True, ''
+
+    async def commit(self, tokens: int):
+        """Finalize the reserved message with its token count and return today's usage."""
+        reservation, self._reservation = self._reservation, None
+        try:
+            return await self.store.commit(reservation, tokens)
+        except Exception as e:
+            # The reply is already paid for; report the usage as of the reservation
+            logging.error(f"Failed to commit rate limit usage for user {self.user_id}: {e}")
+            return dict(reservation.usage)
+
+    async def release(self):
+        """Give back a reserved message slot after a failed upstream call."""
+        reservation, self._reservation = self._reservation, None
+        if reservation is None:
+            return
+        try:
+            await self.store.release(reservation)
+        except Exception as e:
+            logging.error(f"Failed to release rate limit reservation for user {self.user_id}: {e}")
+
+    async def get_usage(self):
+        return await self.store.get_usage(self.user_id, self.today)
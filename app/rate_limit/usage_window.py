@@ -0,0 +1,45 @@
+import datetime
+import logging
+
+# chatAILimiter.json layout:
+#   v1 (legacy): {"2025-06-12": {"messages": 3, "tokens": 1200}, ...} - one key per day, forever
+#   v2:          {"version": 2, "days": {"2025-06-12": {...}}} - only the active window
+USAGE_FORMAT_VERSION = 2
+
+def normalize_usage_data(data: dict) -> dict:
+    """Return data in the v2 layout, migrating a legacy per-day dict in memory."""
+    if data.get("version") == USAGE_FORMAT_VERSION:
+        return data
+    days = {}
+    for key, value in data.items():
+        try:
+            datetime.date.fromisoformat(key)
+        except (TypeError, ValueError):
+            logging.warning(f"Dropping unexpected key in legacy limiter data: {key}")
+            continue
+        days[key] = value
+    return {"version": USAGE_FORMAT_VERSION, "days": days}
+
+def compact_usage_data(data: dict, today: str, window_days: int):
+    """
+    Drop days that fell out of the rolling window ending at today.
+    Returns (compacted_data, evicted_days).
+    """
+    oldest_kept = (datetime.date.fromisoformat(today) - datetime.timedelta(days=window_days - 1)).isoformat()
+    kept, evicted = {}, {}
+    for day, usage in data["days"].items():
+        # ISO dates compare correctly as strings
+        if day >= oldest_kept:
+            kept[day] = usage
+        else:
+            evicted[day] = usage
+    return {"version": USAGE_FORMAT_VERSION, "days": kept}, evicted
+
+def rollup_by_month(days: dict) -> dict:
+    """Sum per-day usage into {"YYYY-MM": {"messages": n, "tokens": n}}."""
+    months = {}
+    for day, usage in days.items():
+        month = months.setdefault(day[:7], {'messages': 0, 'tokens': 0})
+        month['messages'] += usage.get('messages', 0)
+        month['tokens'] += usage.get('tokens', 0)
+    return months
@@ -0,0 +1,64 @@
+import json
+import math
+from typing import Any
+from fastapi.responses import JSONResponse
+
+# orjson is several times faster than the stdlib for large documents. It is
+# optional: without it everything falls back to json with the same output
+# shape (compact, UTF-8).
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def dumps(value: Any) -> bytes:
+    """Serialize value to compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+        except orjson.JSONEncodeError:
+            # e.g. integers beyond 64 bits, which the stdlib handles
+            pass
+    return _stdlib_dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+def _finite(value: Any) -> Any:
+    """Copy of value with NaN and infinities replaced by None."""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    return value
+
+def _stdlib_dumps(value: Any, **options) -> bytes:
+    # The stdlib would write NaN/Infinity, which isn't JSON; orjson writes
+    # null, so do the same. Only values that contain them pay for the copy.
+    try:
+        return json.dumps(value, allow_nan=False, **options).encode("utf-8")
+    except ValueError:
+        return json.dumps(_finite(value), allow_nan=False, **options).encode("utf-8")
+
+def loads(data) -> Any:
+    """Parse JSON from bytes or str. Invalid input raises json.JSONDecodeError."""
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # Let the stdlib decide (and report) what orjson refused
+            pass
+    return json.loads(data)
+
+def canonical_json(value: Any) -> bytes:
+    """
+    Serialize value with sorted keys, for content hashes and chunk digests.
+    Deliberately stdlib only: the bytes must stay identical whether or not
+    orjson is installed.
+    """
+    return _stdlib_dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+class FastJSONResponse(JSONResponse):
+    """Default response class for the app; renders with dumps()."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -1,6 +1,28 @@
-from app.core import get_firebase_storage_bucket
-from app.storage.firebase_storage import FirebaseStorageBackend
+from app.core import get_storage_max_concurrency
+from app.storage.firebase_storage import FirebaseStorageBackend, create_storage_client
+from app.storage.executor_storage import ExecutorStorageBackend
+
+# Process-wide backend shared by every request; created in the app lifespan
+_storage_backend = None
+
+def init_storage_backend():
+    global _storage_backend
+    if _storage_backend is None:
+        _storage_backend = ExecutorStorageBackend(
+            FirebaseStorageBackend(create_storage_client()),
+            max_workers=get_storage_max_concurrency(),
+        )
+    return _storage_backend
 
 def get_storage_backend():
-    # Only firebase backend is implemented, but this is now config-agnostic
-    return FirebaseStorageBackend() 
\ No newline at end of file
+    # Used as a FastAPI dependency. Falls back to lazy creation for callers
+    # running outside the app lifespan (scripts, one-off tools).
+    if _storage_backend is None:
+        return init_storage_backend()
+    return _storage_backend
+
+def close_storage_backend():
+    global _storage_backend
+    if _storage_backend is not None:
+        _storage_backend.close()
+        _storage_backend = None
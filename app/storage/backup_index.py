@@ -0,0 +1,139 @@
+import logging
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from app.storage.base import StorageConflictError
+from app.storage.chunked_backup import CHUNKED_FORMAT, ChunkedBackupStore
+from app.core import get_full_backup_retention_count, get_full_backup_retention_days
+
+# Kept outside full_backups/ so it never shows up among the backups themselves
+INDEX_PATH = "full_backups_index.json"
+BACKUP_PATH_PATTERN = re.compile(r"^full_backups/(\d{4}-\d{2}-\d{2})\.json$")
+# Format of backups stored as the uploaded document itself, which use no chunks
+DOCUMENT_FORMAT = "document"
+
+def backup_path(backup_date: str) -> str:
+    return f"full_backups/{backup_date}.json"
+
+def _empty_index() -> dict:
+    return {"version": 1, "latest": None, "backups": {}}
+
+def prune_backups(backups: dict, today: str, keep_count: int, keep_days: int) -> list:
+    """
+    Dates to drop under the retention policy: beyond the newest keep_count
+    backups, or older than keep_days. A zero limit disables that rule. The
+    newest backup is always kept.
+    """
+    dates = sorted(backups, reverse=True)
+    expired = set()
+    if keep_count > 0:
+        expired.update(dates[keep_count:])
+    if keep_days > 0:
+        cutoff = (datetime.strptime(today, "%Y-%m-%d") - timedelta(days=keep_days)).strftime("%Y-%m-%d")
+        expired.update(date for date in dates if date < cutoff)
+    expired.discard(dates[0] if dates else None)
+    return sorted(expired)
+
+class BackupIndex:
+    """
+    Per-user index of full backups at {uid}/full_backups_index.json:
+
+        {"version": 1, "latest": "YYYY-MM-DD",
+         "backups": {"YYYY-MM-DD": {"path": ..., "savedAt": ..., "format": ...}}}
+
+    Finding the latest backup is one small read instead of a listing that
+    grows with history. The index is updated with generation-match writes
+    when a backup is saved; users from before the index get one built from
+    a listing on first use.
+    """
+
+    def __init__(self, storage, max_attempts: int = 5):
+        self.storage = storage
+        self.max_attempts = max_attempts
+
+    async def _build(self, user_id: str) -> dict:
+        index = _empty_index()
+        for path in await self.storage.list_full_backup_paths(user_id):
+            match = BACKUP_PATH_PATTERN.match(path)
+            if match:
+                index["backups"][match.group(1)] = {"path": path, "savedAt": None, "format": None}
+        index["latest"] = max(index["backups"], default=None)
+        return index
+
+    async def load(self, user_id: str) -> dict:
+        index, generation = await self.storage.load_json_or_default(user_id, INDEX_PATH, None)
+        if index is not None:
+            return index
+        index = await self._build(user_id)
+        try:
+            # Create-only: if a backup write races us, its index wins
+            await self.storage.save_json(user_id, INDEX_PATH, index, if_generation_match=0)
+            logging.info(f"Built full backup index for user {user_id} with {len(index['backups'])} backups")
+        except StorageConflictError:
+            index, _ = await self.storage.load_json_or_default(user_id, INDEX_PATH, index)
+        return index
+
+    async def latest_path(self, user_id: str) -> Optional[str]:
+        index = await self.load(user_id)
+        latest = index.get("latest")
+        return index["backups"][latest]["path"] if latest else None
+
+    async def path_for_date(self, user_id: str, backup_date: str) -> Optional[str]:
+        entry = (await self.load(user_id))["backups"].get(backup_date)
+        return entry["path"] if entry else None
+
+    async def entries(self, user_id: str) -> list:
+        """Backups newest first, as [{"date", "savedAt", "format"}]."""
+        backups = (await self.load(user_id))["backups"]
+        return [
+            {"date": backup_date, "savedAt": backups[backup_date].get("savedAt"), "format": backups[backup_date].get("format")}
+            for backup_date in sorted(backups, reverse=True)
+        ]
+
+    async def _sweep_chunks(self, user_id: str, index: dict, started_at: datetime):
+        formats = {entry.get("format") for entry in index["backups"].values()}
+        if not formats <= {CHUNKED_FORMAT, DOCUMENT_FORMAT}:
+            # Entries built from a listing don't say whether they use chunks
+            logging.info(f"Skipping chunk sweep for user {user_id}: backups of unknown format")
+            return
+        manifest_paths = [entry["path"] for entry in index["backups"].values() if entry.get("format") == CHUNKED_FORMAT]
+        try:
+            deleted = await ChunkedBackupStore(self.storage).sweep(user_id, manifest_paths, started_at)
+        except Exception as e:
+            logging.error(f"Chunk sweep failed for user {user_id}: {e}")
+            return
+        if deleted:
+            logging.info(f"Deleted {deleted} unreferenced backup chunks for user {user_id}")
+
+    async def record(self, user_id: str, backup_date: str, path: str, backup_format: str) -> list:
+        """
+        Add or replace the entry for backup_date, apply the retention policy
+        and delete the backups it drops, along with chunks that no kept
+        backup references any more. Returns the pruned dates.
+        """
+        started_at = datetime.now(timezone.utc)
+        entry = {"path": path, "savedAt": datetime.now(timezone.utc).isoformat(), "format": backup_format}
+        today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        for attempt in range(self.max_attempts):
+            index, generation = await self.storage.load_json_or_default(user_id, INDEX_PATH, None)
+            if index is None:
+                index = await self._build(user_id)
+            index["backups"][backup_date] = entry
+            pruned = prune_backups(index["backups"], today, get_full_backup_retention_count(), get_full_backup_retention_days())
+            pruned_paths = [index["backups"].pop(pruned_date)["path"] for pruned_date in pruned]
+            index["latest"] = max(index["backups"])
+            try:
+                await self.storage.save_json(user_id, INDEX_PATH, index, if_generation_match=generation)
+            except StorageConflictError:
+                logging.info(f"Full backup index conflict for user {user_id} (attempt {attempt + 1})")
+                continue
+            # Deleted only once the index no longer points at them
+            for pruned_path in pruned_paths:
+                try:
+                    await self.storage.delete(user_id, pruned_path)
+                except Exception as e:
+                    logging.error(f"Failed to delete pruned backup {pruned_path} for user {user_id}: {e}")
+            if pruned:
+                await self._sweep_chunks(user_id, index, started_at)
+            return pruned
+        raise StorageConflictError(f"Could not update full backup index for user {user_id}")
@@ -1,11 +1,123 @@
 from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Optional, Tuple
+
+class StorageConflictError(Exception):
+    """Raised when a conditional write loses to a concurrent writer."""
 
 class StorageBackend(ABC):
+    """
+    Blocking object storage. Per-user objects live under {user_id}/{path};
+    the *_object_* methods address shared objects by their full name.
+    """
+
     @abstractmethod
-    def save_json(self, user_id: str, path: str, data: dict): ...
+    def save_json(self, user_id: str, path: str, data: dict, if_generation_match: Optional[int] = None, compress: bool = False) -> int: ...
+
+    @abstractmethod
+    def save_raw(self, user_id: str, path: str, payload: bytes, if_generation_match: Optional[int] = None, compress: bool = False) -> int: ...
+
+    @abstractmethod
+    def save_json_if_changed(self, user_id: str, path: str, data: Any) -> bool: ...
+
+    @abstractmethod
+    def open_writer(self, user_id: str, path: str, chunk_size: int, content_encoding: Optional[str] = None): ...
 
     @abstractmethod
     def load_json(self, user_id: str, path: str) -> dict: ...
 
     @abstractmethod
-    def file_exists(self, user_id: str, path: str) -> bool: ... 
\ No newline at end of file
+    def load_raw(self, user_id: str, path: str) -> Tuple[bytes, Optional[str]]: ...
+
+    @abstractmethod
+    def stat_raw(self, user_id: str, path: str) -> Tuple[int, Optional[str], int]: ...
+
+    @abstractmethod
+    def read_raw_range(self, user_id: str, path: str, start: int, end: int, generation: int) -> bytes: ...
+
+    @abstractmethod
+    def load_json_or_default(self, user_id: str, path: str, default: Any = None) -> Tuple[Any, int]: ...
+
+    @abstractmethod
+    def file_exists(self, user_id: str, path: str) -> bool: ...
+
+    @abstractmethod
+    def delete(self, user_id: str, path: str): ...
+
+    @abstractmethod
+    def list_generations(self, user_id: str, prefix: str) -> dict: ...
+
+    @abstractmethod
+    def list_created_times(self, user_id: str, prefix: str) -> dict: ...
+
+    @abstractmethod
+    def list_full_backup_paths(self, user_id: str) -> list: ...
+
+    @abstractmethod
+    def load_object_json(self, path: str) -> dict: ...
+
+    @abstractmethod
+    def load_object_json_or_default(self, path: str, default: Any = None) -> Tuple[Any, int]: ...
+
+    @abstractmethod
+    def save_object_bytes(self, path: str, payload: bytes, content_type: str): ...
+
+    @abstractmethod
+    def list_object_names(self, prefix: str) -> list: ...
+
+class AsyncStorageBackend(ABC):
+    """Awaitable counterpart of StorageBackend used by the API routers."""
+
+    @abstractmethod
+    async def save_json(self, user_id: str, path: str, data: dict, if_generation_match: Optional[int] = None, compress: bool = False) -> int: ...
+
+    @abstractmethod
+    async def save_raw(self, user_id: str, path: str, payload: bytes, if_generation_match: Optional[int] = None, compress: bool = False) -> int: ...
+
+    @abstractmethod
+    async def save_json_if_changed(self, user_id: str, path: str, data: Any) -> bool: ...
+
+    @abstractmethod
+    async def open_upload(self, user_id: str, path: str, chunk_size: int, content_encoding: Optional[str] = None):
+        """Start an upload with async write(), close() and abort()."""
+
+    @abstractmethod
+    async def load_json(self, user_id: str, path: str) -> dict: ...
+
+    @abstractmethod
+    async def load_raw(self, user_id: str, path: str) -> Tuple[bytes, Optional[str]]: ...
+
+    @abstractmethod
+    async def open_raw_stream(self, user_id: str, path: str, chunk_size: int) -> Tuple[int, Optional[str], AsyncIterator[bytes]]: ...
+
+    @abstractmethod
+    async def read_raw_range(self, user_id: str, path: str, start: int, end: int, generation: int) -> bytes: ...
+
+    @abstractmethod
+    async def load_json_or_default(self, user_id: str, path: str, default: Any = None) -> Tuple[Any, int]: ...
+
+    @abstractmethod
+    async def file_exists(self, user_id: str, path: str) -> bool: ...
+
+    @abstractmethod
+    async def delete(self, user_id: str, path: str): ...
+
+    @abstractmethod
+    async def list_generations(self, user_id: str, prefix: str) -> dict: ...
+
+    @abstractmethod
+    async def list_created_times(self, user_id: str, prefix: str) -> dict: ...
+
+    @abstractmethod
+    async def list_full_backup_paths(self, user_id: str) -> list: ...
+
+    @abstractmethod
+    async def load_object_json(self, path: str) -> dict: ...
+
+    @abstractmethod
+    async def load_object_json_or_default(self, path: str, default: Any = None) -> Tuple[Any, int]: ...
+
+    @abstractmethod
+    async def save_object_bytes(self, path: str, payload: bytes, content_type: str): ...
+
+    @abstractmethod
+    async def list_object_names(self, prefix: str) -> list: ...
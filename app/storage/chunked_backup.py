@@ -0,0 +1,277 @@
+import asyncio
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Optional
+from app.serialization import canonical_json
+from app.storage.base import StorageConflictError
+from app.storage.streams import gunzip_stream, prepend
+
+# Marker key of a manifest stored at full_backups/{date}.json. Backups written
+# before chunking are the raw exported document and have no such key.
+FORMAT_KEY = "__backup_format__"
+CHUNKED_FORMAT = "chunked-v1"
+CHUNKS_PREFIX = "backup_chunks"
+UPLOAD_CONCURRENCY = 8
+# Sections fetched ahead of the one being streamed on restore
+PREFETCH_SECTIONS = 8
+# Unreferenced chunks younger than this may belong to a save whose manifest
+# isn't written yet, so the sweep leaves them for the next one
+CHUNK_SWEEP_GRACE = timedelta(hours=1)
+# Smaller chunks aren't worth the gzip header and CPU
+COMPRESS_MIN_BYTES = 1024
+# Object values at least twice this size are split into groups of sub-keys
+# of roughly this size
+GROUP_TARGET_BYTES = 64 * 1024
+MAX_GROUPS = 256
+
+def _group_count(size: int) -> int:
+    # Powers of two, so the count (and every group's members) only changes
+    # when a value doubles or halves in size
+    groups = 1
+    while groups < MAX_GROUPS and size >= groups * 2 * GROUP_TARGET_BYTES:
+        groups *= 2
+    return groups
+
+def _group_of(sub_key: str, groups: int) -> int:
+    return int.from_bytes(hashlib.sha256(sub_key.encode("utf-8")).digest()[:4], "big") % groups
+
+def split_backup(body: dict) -> list:
+    """
+    Split an exported backup into stable sections, returned as
+    [(section, value)] where section is {"path": [key], "group": n} for one
+    group of a large object value and {"path": [key], "group": None} for a
+    whole value.
+
+    Each top-level key is a section. Object values of 128 KiB or more (e.g.
+    "data" with an entry per day) are split into groups of about
+    GROUP_TARGET_BYTES, assigning each sub-key to a group by a hash of the
+    sub-key. Group membership doesn't depend on neighbouring keys, so an
+    edit only changes the group it lands in and the rest still dedupe.
+    """
+    sections = []
+    for key, value in body.items():
+        if isinstance(value, dict) and value:
+            groups = _group_count(len(canonical_json(value)))
+            if groups > 1:
+                members = [{} for _ in range(groups)]
+                for sub_key, sub_value in value.items():
+                    members[_group_of(sub_key, groups)][sub_key] = sub_value
+                sections.extend(({"path": [key], "group": group}, group_value) for group, group_value in enumerate(members) if group_value)
+                continue
+        sections.append(({"path": [key], "group": None}, value))
+    return sections
+
+async def _object_members(pieces: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Yield a streamed JSON object without its outer braces."""
+    started = False
+    held = b""
+    async for piece in pieces:
+        if not started:
+            piece = piece.lstrip()
+            if not piece:
+                continue
+            piece, started = piece[1:], True
+        # Hold back the tail so the closing brace can be dropped at the end
+        if piece.strip():
+            if held:
+                yield held
+            held = piece
+        else:
+            held += piece
+    held = held.rstrip()
+    if held[:-1]:
+        yield held[:-1]
+
+def is_chunked_manifest(data) -> bool:
+    return isinstance(data, dict) and data.get(FORMAT_KEY) == CHUNKED_FORMAT
+
+def is_chunked_manifest_bytes(raw: bytes) -> bool:
+    # Manifests are written uncompressed with the marker as their first key,
+    # which lets raw reads tell them apart without parsing the document
+    return raw.lstrip().startswith(b'{"' + FORMAT_KEY.encode() + b'"')
+
+async def _nothing() -> AsyncIterator[bytes]:
+    return
+    yield
+
+class ChunkedBackupStore:
+    """
+    Content-addressed full backups. Each section (see split_backup) is
+    stored once under backup_chunks/{sha256}.json; a per-date manifest lists
+    which chunk holds which section. Uploads only send chunks the previous backup didn't have,
+    so storage and bandwidth grow with what changed, not with total history.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    @staticmethod
+    def _chunk_path(digest: str) -> str:
+        return f"{CHUNKS_PREFIX}/{digest}.json"
+
+    async def _known_chunks(self, user_id: str, previous_path: Optional[str]) -> set:
+        if not previous_path:
+            return set()
+        try:
+            previous, _ = await self.storage.load_json_or_default(user_id, previous_path, {})
+        except Exception as e:
+            logging.warning(f"Could not read previous backup manifest {previous_path} for user {user_id}: {e}")
+            return set()
+        if not is_chunked_manifest(previous):
+            return set()
+        return {section["chunk"] for section in previous["sections"]}
+
+    async def _upload_chunk(self, user_id: str, digest: str, encoded: bytes, semaphore: asyncio.Semaphore):
+        async with semaphore:
+            try:
+                # Chunks are immutable: create-only, an existing one is already correct.
+                # The hashed bytes are what gets stored, so a chunk's size is known.
+                await self.storage.save_raw(user_id, self._chunk_path(digest), encoded, if_generation_match=0, compress=len(encoded) >= COMPRESS_MIN_BYTES)
+                return True
+            except StorageConflictError:
+                return False
+
+    async def save(self, user_id: str, path: str, body: dict, previous_path: Optional[str] = None) -> dict:
+        """Store body as a manifest at path plus any new chunks. Returns upload stats."""
+        known = await self._known_chunks(user_id, previous_path)
+        manifest_sections = []
+        new_chunks = {}
+        for section, value in split_backup(body):
+            encoded = canonical_json(value)
+            digest = hashlib.sha256(encoded).hexdigest()
+            manifest_sections.append({**section, "chunk": digest, "size": len(encoded)})
+            if digest not in known:
+                new_chunks[digest] = encoded
+
+        semaphore = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+        uploaded = await asyncio.gather(*(self._upload_chunk(user_id, digest, encoded, semaphore) for digest, encoded in new_chunks.items()))
+
+        manifest = {
+            FORMAT_KEY: CHUNKED_FORMAT,
+            "exportedAt": body.get("exportedAt"),
+            "sections": manifest_sections,
+        }
+        await self.storage.save_json(user_id, path, manifest)
+        return {"sections": len(manifest_sections), "chunks_uploaded": sum(uploaded)}
+
+    async def sweep(self, user_id: str, manifest_paths: list, started_at: datetime) -> int:
+        """
+        Delete the chunks that none of manifest_paths (every chunked backup
+        still kept) reference. Chunks created after started_at minus
+        CHUNK_SWEEP_GRACE are kept whether referenced or not. Returns how
+        many chunks were deleted.
+        """
+        semaphore = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+
+        async def load(path):
+            async with semaphore:
+                manifest, _ = await self.storage.load_json_or_default(user_id, path, None)
+            if manifest is not None and not is_chunked_manifest(manifest):
+                raise ValueError(f"{path} is not a chunked backup manifest")
+            return manifest
+
+        referenced = set()
+        for manifest in await asyncio.gather(*(load(path) for path in manifest_paths)):
+            if manifest is not None:
+                referenced.update(section["chunk"] for section in manifest["sections"])
+        cutoff = started_at - CHUNK_SWEEP_GRACE
+        created = await self.storage.list_created_times(user_id, f"{CHUNKS_PREFIX}/")
+        orphans = [
+            path for path, created_at in created.items()
+            if created_at < cutoff and path[len(CHUNKS_PREFIX) + 1:-len(".json")] not in referenced
+        ]
+
+        async def delete(path):
+            async with semaphore:
+                try:
+                    await self.storage.delete(user_id, path)
+                    return True
+                except Exception as e:
+                    logging.error(f"Failed to delete unreferenced chunk {path} for user {user_id}: {e}")
+                    return False
+
+        return sum(await asyncio.gather(*(delete(path) for path in orphans)))
+
+    async def _fetch_chunk(self, user_id: str, section: dict, chunk_size: int):
+        """
+        Start reading a section's chunk, buffering at most about chunk_size of
+        it. Returns (content_encoding, head, rest) where rest streams the
+        remainder, or is None when head is the whole object.
+        """
+        path = self._chunk_path(section["chunk"])
+        if section["size"] <= chunk_size:
+            # Small chunk: one request, no stat
+            raw, content_encoding = await self.storage.load_raw(user_id, path)
+            return content_encoding, raw, None
+        _, content_encoding, pieces = await self.storage.open_raw_stream(user_id, path, chunk_size)
+        return content_encoding, await anext(pieces, b""), pieces
+
+    @staticmethod
+    async def _chunk_pieces(fetched, chunk_size: int) -> AsyncIterator[bytes]:
+        content_encoding, head, rest = fetched
+        pieces = prepend(head, rest if rest is not None else _nothing())
+        if content_encoding == "gzip":
+            pieces = gunzip_stream(pieces, chunk_size)
+        async for piece in pieces:
+            yield piece
+
+    async def stream(self, user_id: str, manifest: dict, chunk_size: int) -> AsyncIterator[bytes]:
+        """
+        Yield the original backup document as JSON bytes, splicing each stored
+        chunk in as-is. The next PREFETCH_SECTIONS chunks are fetched
+        concurrently while the current one is sent, each buffered to about
+        chunk_size, so memory stays bounded however large the backup is.
+        """
+        sections = manifest["sections"]
+        fetches = {}
+
+        def prefetch(position: int):
+            if position < len(sections):
+                fetches[position] = asyncio.ensure_future(self._fetch_chunk(user_id, sections[position], chunk_size))
+
+        for position in range(PREFETCH_SECTIONS):
+            prefetch(position)
+        try:
+            async for piece in self._stream_sections(sections, fetches, prefetch, chunk_size):
+                yield piece
+        finally:
+            # Client went away or a read failed: stop the reads still in flight
+            for task in fetches.values():
+                if task.done() and not task.cancelled():
+                    task.exception()
+                else:
+                    task.cancel()
+
+    async def _stream_sections(self, sections: list, fetches: dict, prefetch, chunk_size: int) -> AsyncIterator[bytes]:
+        open_key = None
+        first_key = first_sub_key = True
+        yield b"{"
+        for position, section in enumerate(sections):
+            grouped = section["group"] is not None
+            if grouped:
+                key = section["path"][0]
+                # A key's groups are contiguous and each holds some of its members
+                if key != open_key:
+                    if open_key is not None:
+                        yield b"}"
+                    yield (b"" if first_key else b",") + json.dumps(key).encode("utf-8") + b":{"
+                    open_key, first_key, first_sub_key = key, False, True
+                if not first_sub_key:
+                    yield b","
+                first_sub_key = False
+            else:
+                if open_key is not None:
+                    yield b"}"
+                    open_key = None
+                yield (b"" if first_key else b",") + json.dumps(section["path"][0]).encode("utf-8") + b":"
+                first_key = False
+            fetched = await fetches.pop(position)
+            prefetch(position + PREFETCH_SECTIONS)
+            pieces = self._chunk_pieces(fetched, chunk_size)
+            async for piece in (_object_members(pieces) if grouped else pieces):
+                yield piece
+        if open_key is not None:
+            yield b"}"
+        yield b"}"
@@ -0,0 +1,144 @@
+import asyncio
+import functools
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Optional, Tuple
+from app.storage.base import AsyncStorageBackend, StorageBackend
+
+# Ranged reads kept in flight ahead of the one being consumed
+STREAM_READ_AHEAD = 4
+
+class AsyncUpload:
+    """Awaitable wrapper around a blocking upload writer."""
+
+    def __init__(self, run, writer):
+        self._run = run
+        self._writer = writer
+
+    async def write(self, data: bytes):
+        if data:
+            await self._run(self._writer.write, data)
+
+    async def close(self):
+        await self._run(self._writer.close)
+
+    async def abort(self):
+        """
+        Cancel the upload so nothing is stored. A writer that is merely
+        dropped finalizes the upload when it is garbage-collected.
+        """
+        try:
+            await self._run(self._writer.terminate)
+        except Exception as e:
+            logging.warning(f"Failed to cancel upload: {e}")
+
+class ExecutorStorageBackend(AsyncStorageBackend):
+    """
+    Runs a synchronous StorageBackend on a bounded thread pool so blocking
+    GCS calls never run on the event loop. max_workers caps how many storage
+    requests a worker process has in flight at once.
+    """
+
+    def __init__(self, backend: StorageBackend, max_workers: int):
+        self.backend = backend
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="storage")
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def save_json(self, user_id: str, path: str, data: dict, if_generation_match: Optional[int] = None, compress: bool = False) -> int:
+        return await self._run(self.backend.save_json, user_id, path, data, if_generation_match, compress)
+
+    async def save_raw(self, user_id: str, path: str, payload: bytes, if_generation_match: Optional[int] = None, compress: bool = False) -> int:
+        return await self._run(self.backend.save_raw, user_id, path, payload, if_generation_match, compress)
+
+    async def save_json_if_changed(self, user_id: str, path: str, data: Any) -> bool:
+        return await self._run(self.backend.save_json_if_changed, user_id, path, data)
+
+    async def open_upload(self, user_id: str, path: str, chunk_size: int, content_encoding: Optional[str] = None) -> AsyncUpload:
+        writer = await self._run(self.backend.open_writer, user_id, path, chunk_size, content_encoding)
+        return AsyncUpload(self._run, writer)
+
+    async def load_json(self, user_id: str, path: str) -> dict:
+        return await self._run(self.backend.load_json, user_id, path)
+
+    async def load_json_or_default(self, user_id: str, path: str, default: Any = None) -> Tuple[Any, int]:
+        return await self._run(self.backend.load_json_or_default, user_id, path, default)
+
+    async def load_raw(self, user_id: str, path: str) -> Tuple[bytes, Optional[str]]:
+        return await self._run(self.backend.load_raw, user_id, path)
+
+    async def open_raw_stream(self, user_id: str, path: str, chunk_size: int, read_ahead: int = STREAM_READ_AHEAD) -> Tuple[int, Optional[str], AsyncIterator[bytes]]:
+        """
+        Stream an object's stored bytes in ranged reads of chunk_size, pinned
+        to the generation current at open. Returns (size, content_encoding,
+        chunks). Up to read_ahead further ranges are fetched while one is
+        consumed, so memory use is bounded by chunk_size * (read_ahead + 1),
+        not object size.
+        """
+        size, content_encoding, generation = await self._run(self.backend.stat_raw, user_id, path)
+
+        async def chunks():
+            starts = iter(range(0, size, chunk_size))
+            reads = deque()
+
+            def read_next():
+                start = next(starts, None)
+                if start is not None:
+                    end = min(start + chunk_size, size) - 1
+                    reads.append(asyncio.ensure_future(self._run(self.backend.read_raw_range, user_id, path, start, end, generation)))
+
+            for _ in range(read_ahead + 1):
+                read_next()
+            try:
+                while reads:
+                    data = await reads[0]
+                    reads.popleft()
+                    read_next()
+                    yield data
+            finally:
+                # Consumer went away or a read failed: drop the reads still in flight
+                for read in reads:
+                    if read.done() and not read.cancelled():
+                        read.exception()
+                    else:
+                        read.cancel()
+
+        return size, content_encoding, chunks()
+
+    async def file_exists(self, user_id: str, path: str) -> bool:
+        return await self._run(self.backend.file_exists, user_id, path)
+
+    async def delete(self, user_id: str, path: str):
+        await self._run(self.backend.delete, user_id, path)
+
+    async def read_raw_range(self, user_id: str, path: str, start: int, end: int, generation: int) -> bytes:
+        return await self._run(self.backend.read_raw_range, user_id, path, start, end, generation)
+
+    async def list_generations(self, user_id: str, prefix: str) -> dict:
+        return await self._run(self.backend.list_generations, user_id, prefix)
+
+    async def list_created_times(self, user_id: str, prefix: str) -> dict:
+        return await self._run(self.backend.list_created_times, user_id, prefix)
+
+    async def list_full_backup_paths(self, user_id: str) -> list:
+        return await self._run(self.backend.list_full_backup_paths, user_id)
+
+    async def load_object_json(self, path: str) -> dict:
+        return await self._run(self.backend.load_object_json, path)
+
+    async def save_object_bytes(self, path: str, payload: bytes, content_type: str):
+        await self._run(self.backend.save_object_bytes, path, payload, content_type)
+
+    async def load_object_json_or_default(self, path: str, default: Any = None) -> Tuple[Any, int]:
+        return await self._run(self.backend.load_object_json_or_default, path, default)
+
+    async def list_object_names(self, prefix: str) -> list:
+        return await self._run(self.backend.list_object_names, prefix)
+
+    def close(self):
+        # Let in-flight storage calls finish before the HTTP session goes away
+        self._executor.shutdown(wait=True)
+        self.backend.close()
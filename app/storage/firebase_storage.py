@@ -1,50 +1,203 @@
 from google.cloud import storage
-import json
-from app.storage.base import StorageBackend
-from app.core import get_firebase_storage_bucket
+from google.api_core.exceptions import NotFound, PreconditionFailed
+import google.auth
+from google.auth.transport.requests import AuthorizedSession
+from requests.adapters import HTTPAdapter
+import gzip
+import hashlib
+from app.storage.base import StorageBackend, StorageConflictError
+from app.serialization import canonical_json, dumps, loads
+from app.core import get_firebase_storage_bucket, get_storage_http_pool_size
 import os
-from typing import Optional
+from typing import Any, Optional, Tuple
 import logging
 
+def create_storage_client() -> storage.Client:
+    """
+    Build a GCS client on top of a single authorized session with a pooled
+    HTTP transport, so credentials are loaded once and TLS connections are
+    reused across requests.
+    """
+    credentials, project = google.auth.default(scopes=storage.Client.SCOPE)
+    session = AuthorizedSession(credentials)
+    pool_size = get_storage_http_pool_size()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    logging.info(f"Created storage client with HTTP pool size {pool_size}")
+    return storage.Client(project=project, credentials=credentials, _http=session)
+
+# Custom metadata holding the SHA-256 of an object's canonical JSON
+CONTENT_HASH_METADATA_KEY = "contentSha256"
+
 class FirebaseStorageBackend(StorageBackend):
-    def __init__(self):
-        self.client = storage.Client()
+    def __init__(self, client: Optional[storage.Client] = None):
+        self.client = client or storage.Client()
         self.bucket = self.client.bucket(get_firebase_storage_bucket())
 
+    def close(self):
+        # Closes the underlying HTTP session and its pooled connections
+        self.client.close()
+
     def _blob_path(self, user_id: str, path: str) -> str:
         return f"{user_id}/{path}"
 
-    def save_json(self, user_id: str, path: str, data: dict):
+    def save_json(self, user_id: str, path: str, data: dict, if_generation_match: Optional[int] = None, compress: bool = False) -> int:
+        """
+        Upload data and return the new object generation. With
+        if_generation_match the write only succeeds if the stored object is
+        still at that generation (0 means it must not exist yet).
+        With compress the object is stored gzipped with Content-Encoding: gzip;
+        the load_json* methods decompress it transparently.
+        """
+        blob = self.bucket.blob(self._blob_path(user_id, path))
+        payload = dumps(data)
+        if compress:
+            payload = gzip.compress(payload, compresslevel=6)
+            blob.content_encoding = "gzip"
+        try:
+            blob.upload_from_string(payload, content_type='application/json', if_generation_match=if_generation_match)
+        except PreconditionFailed:
+            raise StorageConflictError(f"{path} changed concurrently for user {user_id}")
+        return blob.generation
+
+    def save_raw(self, user_id: str, path: str, payload: bytes, if_generation_match: Optional[int] = None, compress: bool = False) -> int:
+        """
+        Upload already-serialized JSON bytes and return the new generation.
+        compress and if_generation_match behave as in save_json.
+        """
+        blob = self.bucket.blob(self._blob_path(user_id, path))
+        if compress:
+            payload = gzip.compress(payload, compresslevel=6)
+            blob.content_encoding = "gzip"
+        try:
+            blob.upload_from_string(payload, content_type='application/json', if_generation_match=if_generation_match)
+        except PreconditionFailed:
+            raise StorageConflictError(f"{path} changed concurrently for user {user_id}")
+        return blob.generation
+
+    def save_json_if_changed(self, user_id: str, path: str, data: Any) -> bool:
+        """
+        Upload data unless the stored object already holds the same canonical
+        JSON, judged by a content hash kept in the object's metadata. Costs a
+        metadata read instead of an upload when nothing changed. Returns
+        whether an upload happened.
+        """
+        digest = hashlib.sha256(canonical_json(data)).hexdigest()
+        existing = self.bucket.get_blob(self._blob_path(user_id, path))
+        if existing is not None and (existing.metadata or {}).get(CONTENT_HASH_METADATA_KEY) == digest:
+            return False
         blob = self.bucket.blob(self._blob_path(user_id, path))
-        blob.upload_from_string(json.dumps(data), content_type='application/json')
+        blob.metadata = {CONTENT_HASH_METADATA_KEY: digest}
+        blob.upload_from_string(dumps(data), content_type='application/json')
+        return True
+
+    def open_writer(self, user_id: str, path: str, chunk_size: int, content_encoding: Optional[str] = None):
+        """
+        Start a resumable upload and return its file-like writer. Bytes are
+        sent chunk_size at a time (a multiple of 256 KiB) and the object
+        appears once the writer is closed. To abandon an upload call
+        terminate(): a writer that is just dropped closes, and so commits
+        what it holds, when it is garbage-collected.
+        """
+        blob = self.bucket.blob(self._blob_path(user_id, path))
+        blob.content_encoding = content_encoding
+        return blob.open("wb", chunk_size=chunk_size, content_type="application/json", ignore_flush=True)
 
     def load_json(self, user_id: str, path: str) -> dict:
         blob = self.bucket.blob(self._blob_path(user_id, path))
-        if not blob.exists():
+        try:
+            data = blob.download_as_bytes()
+        except NotFound:
+            raise FileNotFoundError(f"{path} not found for user {user_id}")
+        return loads(data)
+
+    def load_raw(self, user_id: str, path: str) -> Tuple[bytes, Optional[str]]:
+        """
+        Return the stored bytes exactly as uploaded plus their content
+        encoding ("gzip" or None), without decompressing.
+        """
+        blob = self.bucket.blob(self._blob_path(user_id, path))
+        try:
+            data = blob.download_as_bytes(raw_download=True)
+        except NotFound:
             raise FileNotFoundError(f"{path} not found for user {user_id}")
-        data = blob.download_as_string()
-        return json.loads(data)
+        return data, blob.content_encoding
+
+    def stat_raw(self, user_id: str, path: str) -> Tuple[int, Optional[str], int]:
+        """Return (size, content_encoding, generation) of a stored object."""
+        blob = self.bucket.get_blob(self._blob_path(user_id, path))
+        if blob is None:
+            raise FileNotFoundError(f"{path} not found for user {user_id}")
+        return blob.size, blob.content_encoding, blob.generation
+
+    def read_raw_range(self, user_id: str, path: str, start: int, end: int, generation: int) -> bytes:
+        """Read stored bytes [start, end] (inclusive) of one object generation, without decompressing."""
+        blob = self.bucket.blob(self._blob_path(user_id, path), generation=generation)
+        try:
+            return blob.download_as_bytes(start=start, end=end, raw_download=True)
+        except NotFound:
+            raise FileNotFoundError(f"{path} (generation {generation}) not found for user {user_id}")
+
+    def load_json_or_default(self, user_id: str, path: str, default: Any = None) -> Tuple[Any, int]:
+        """
+        Read an object in a single request and return (data, generation).
+        A missing object yields (default, 0); generation 0 is what GCS expects
+        as a precondition for "object must not exist yet".
+        """
+        blob = self.bucket.blob(self._blob_path(user_id, path))
+        try:
+            data = blob.download_as_bytes()
+        except NotFound:
+            return default, 0
+        return loads(data), blob.generation
 
     def file_exists(self, user_id: str, path: str) -> bool:
         blob = self.bucket.blob(self._blob_path(user_id, path))
         return blob.exists()
 
-    def get_latest_full_backup_path(self, user_id: str) -> Optional[str]:
-        # List all blobs in the user's full_backups folder
-        prefix = f"{user_id}/full_backups/"
-        blobs = list(self.bucket.list_blobs(prefix=prefix))
-        if not blobs:
-            return None
-        # Extract date from each blob name and find the latest
-        def get_date(blob):
-            try:
-                filename = blob.name.split('/')[-1] # get the filename
-                return filename.replace('.json', '')
-            except Exception:
-                return ""
-        blobs_with_dates = [(b, get_date(b)) for b in blobs if get_date(b)]
-        if not blobs_with_dates:
-            return None
-        # Sort by date string (ISO format sorts correctly)
-        latest_blob, _ = max(blobs_with_dates, key=lambda x: x[1])
-        return latest_blob.name[len(f"{user_id}/"):] 
\ No newline at end of file
+    def load_object_json(self, path: str) -> dict:
+        # Shared (non user-scoped) objects such as admin/ and content/ files
+        blob = self.bucket.blob(path)
+        try:
+            data = blob.download_as_bytes()
+        except NotFound:
+            raise FileNotFoundError(f"{path} not found")
+        return loads(data)
+
+    def save_object_bytes(self, path: str, payload: bytes, content_type: str):
+        """Upload a shared (non user-scoped) object as-is."""
+        self.bucket.blob(path).upload_from_string(payload, content_type=content_type)
+
+    def load_object_json_or_default(self, path: str, default: Any = None) -> Tuple[Any, int]:
+        """Shared-object counterpart of load_json_or_default."""
+        blob = self.bucket.blob(path)
+        try:
+            data = blob.download_as_bytes()
+        except NotFound:
+            return default, 0
+        return loads(data), blob.generation
+
+    def list_object_names(self, prefix: str) -> list:
+        return [blob.name for blob in self.bucket.list_blobs(prefix=prefix)]
+
+    def delete(self, user_id: str, path: str):
+        blob = self.bucket.blob(self._blob_path(user_id, path))
+        try:
+            blob.delete()
+        except NotFound:
+            pass
+
+    def list_generations(self, user_id: str, prefix: str) -> dict:
+        """Map each user-relative path under prefix to its current generation."""
+        user_prefix = f"{user_id}/"
+        return {blob.name[len(user_prefix):]: blob.generation for blob in self.bucket.list_blobs(prefix=f"{user_prefix}{prefix}")}
+
+    def list_created_times(self, user_id: str, prefix: str) -> dict:
+        """Map each user-relative path under prefix to its creation time (UTC)."""
+        user_prefix = f"{user_id}/"
+        return {blob.name[len(user_prefix):]: blob.time_created for blob in self.bucket.list_blobs(prefix=f"{user_prefix}{prefix}")}
+
+    def list_full_backup_paths(self, user_id: str) -> list:
+        """User-relative paths of every object under full_backups/."""
+        user_prefix = f"{user_id}/"
+        return [blob.name[len(user_prefix):] for blob in self.bucket.list_blobs(prefix=f"{user_prefix}full_backups/")]
@@ -0,0 +1,36 @@
+import zlib
+from typing import AsyncIterator
+
+# wbits for the gzip container (header + trailer) rather than a raw zlib stream
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+# Largest piece gunzip_stream yields, whatever the compression ratio
+GUNZIP_MAX_PIECE = 256 * 1024
+
+async def gunzip_stream(chunks: AsyncIterator[bytes], max_length: int = GUNZIP_MAX_PIECE) -> AsyncIterator[bytes]:
+    decompressor = zlib.decompressobj(GZIP_WBITS)
+    async for chunk in chunks:
+        while True:
+            data = decompressor.decompress(chunk, max_length)
+            if data:
+                yield data
+            chunk = decompressor.unconsumed_tail
+            # A full piece may leave output pending even with no input left
+            if not chunk and len(data) < max_length:
+                break
+    data = decompressor.flush()
+    if data:
+        yield data
+
+async def gzip_stream(chunks: AsyncIterator[bytes], level: int = 6) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, GZIP_WBITS)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+async def prepend(first: bytes, rest: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    yield first
+    async for chunk in rest:
+        yield chunk
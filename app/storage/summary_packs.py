@@ -0,0 +1,165 @@
+import asyncio
+import gzip
+import json
+import logging
+from datetime import date, datetime, timedelta, timezone
+
+SUMMARIES_PREFIX = "data"
+PACKS_PREFIX = "data_packs"
+FETCH_CONCURRENCY = 8
+
+def summary_path(summary_date: str) -> str:
+    return f"{SUMMARIES_PREFIX}/{summary_date}.json"
+
+def pack_path(month: str) -> str:
+    return f"{PACKS_PREFIX}/{month}.json"
+
+def pack_index_path(month: str) -> str:
+    return f"{PACKS_PREFIX}/{month}.index.json"
+
+def month_of(summary_date: str) -> str:
+    return summary_date[:7]
+
+def is_complete_month(month: str) -> bool:
+    return month < datetime.now(timezone.utc).strftime("%Y-%m")
+
+def dates_between(start: date, end: date) -> list:
+    return [(start + timedelta(days=offset)).isoformat() for offset in range((end - start).days + 1)]
+
+def _decode(raw: bytes, content_encoding) -> bytes:
+    return gzip.decompress(raw) if content_encoding == "gzip" else raw
+
+# Compactions scheduled by this process, so a month is only packed once at a time
+_compacting = set()
+_compaction_tasks = set()
+
+class SummaryPackStore:
+    """
+    Range reads over the per-day summaries in data/{date}.json.
+
+    Completed months are rolled into data_packs/{YYYY-MM}.json, one JSON
+    object of date -> summary, next to an index of each summary's byte
+    offset and length. A range within a packed month is then one index read
+    plus one ranged fetch instead of a fetch per day. Summaries come back as
+    the stored bytes and are never parsed.
+
+    Day files stay the source of truth: a write to a packed month deletes
+    its index, which sends reads back to the day files until the month is
+    compacted again.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    async def _load_day_files(self, user_id: str, paths: list, semaphore: asyncio.Semaphore) -> dict:
+        async def load(path):
+            async with semaphore:
+                try:
+                    raw, content_encoding = await self.storage.load_raw(user_id, path)
+                except FileNotFoundError:
+                    return None
+                return path, _decode(raw, content_encoding)
+
+        loaded = await asyncio.gather(*(load(path) for path in paths))
+        # data/2024-06-10.json -> 2024-06-10
+        return {path[len(SUMMARIES_PREFIX) + 1:-len(".json")]: raw for path, raw in filter(None, loaded)}
+
+    async def _read_days(self, user_id: str, month: str, wanted: set, semaphore: asyncio.Semaphore) -> dict:
+        # One listing tells us which days exist, so absent days cost no fetch
+        listed = await self.storage.list_generations(user_id, f"{SUMMARIES_PREFIX}/{month}-")
+        paths = [path for path in listed if path[len(SUMMARIES_PREFIX) + 1:-len(".json")] in wanted]
+        return await self._load_day_files(user_id, paths, semaphore)
+
+    async def _read_pack(self, user_id: str, month: str, wanted: set):
+        """Summaries for wanted dates from the month's pack, or None when it isn't packed."""
+        index, _ = await self.storage.load_json_or_default(user_id, pack_index_path(month), None)
+        if index is None:
+            return None
+        spans = sorted((offset, length, day) for day, (offset, length) in index["dates"].items() if day in wanted)
+        if not spans:
+            return {}
+        start = spans[0][0]
+        end = spans[-1][0] + spans[-1][1] - 1
+        try:
+            raw = await self.storage.read_raw_range(user_id, pack_path(month), start, end, index["generation"])
+        except FileNotFoundError:
+            # Re-packed since the index was read
+            return None
+        return {day: raw[offset - start:offset - start + length] for offset, length, day in spans}
+
+    async def read_range(self, user_id: str, start: date, end: date, use_packs: bool = True) -> dict:
+        """Return {date: raw summary bytes} for the stored days in [start, end]."""
+        months = {}
+        for day in dates_between(start, end):
+            months.setdefault(month_of(day), set()).add(day)
+        # One limit for the whole range, however many months it spans
+        semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
+
+        async def read_month(month, wanted):
+            if use_packs and is_complete_month(month):
+                async with semaphore:
+                    packed = await self._read_pack(user_id, month, wanted)
+                if packed is not None:
+                    return packed
+                self.schedule_compaction(user_id, month)
+            return await self._read_days(user_id, month, wanted, semaphore)
+
+        summaries = {}
+        for result in await asyncio.gather(*(read_month(month, wanted) for month, wanted in months.items())):
+            summaries.update(result)
+        return dict(sorted(summaries.items()))
+
+    async def compact(self, user_id: str, month: str) -> int:
+        """Pack a completed month's day files. Returns how many days were packed."""
+        listed = await self.storage.list_generations(user_id, f"{SUMMARIES_PREFIX}/{month}-")
+        days = await self._load_day_files(user_id, sorted(listed), asyncio.Semaphore(FETCH_CONCURRENCY))
+        offsets, generation = {}, None
+        # An empty month gets an empty index and no pack, so reading it costs one read
+        if days:
+            parts = [b"{"]
+            position = 1
+            for day, raw in sorted(days.items()):
+                prefix = (b"," if offsets else b"") + json.dumps(day).encode("utf-8") + b":"
+                offsets[day] = [position + len(prefix), len(raw)]
+                parts += [prefix, raw]
+                position += len(prefix) + len(raw)
+            parts.append(b"}")
+            generation = await self.storage.save_raw(user_id, pack_path(month), b"".join(parts))
+        index = {"version": 1, "generation": generation, "dates": offsets}
+        await self.storage.save_json(user_id, pack_index_path(month), index)
+        # A day written while we were packing may have missed invalidate();
+        # if anything changed since the listing, drop the index again
+        if await self.storage.list_generations(user_id, f"{SUMMARIES_PREFIX}/{month}-") != listed:
+            await self.invalidate(user_id, month)
+            logging.info(f"Summary pack for {month} changed during compaction for user {user_id}; discarded")
+            return 0
+        return len(days)
+
+    async def invalidate(self, user_id: str, month: str):
+        await self.storage.delete(user_id, pack_index_path(month))
+
+    async def after_write(self, user_id: str, summary_date: str):
+        """Keep packs consistent with a day file that was just written."""
+        month = month_of(summary_date)
+        if is_complete_month(month):
+            await self.invalidate(user_id, month)
+
+    def schedule_compaction(self, user_id: str, month: str):
+        key = (user_id, month)
+        if key in _compacting:
+            return
+
+        async def run():
+            try:
+                packed = await self.compact(user_id, month)
+                if packed:
+                    logging.info(f"Packed {packed} summaries for {month} for user {user_id}")
+            except Exception as e:
+                logging.error(f"Summary compaction for {month} failed for user {user_id}: {e}")
+            finally:
+                _compacting.discard(key)
+
+        _compacting.add(key)
+        task = asyncio.create_task(run())
+        _compaction_tasks.add(task)
+        task.add_done_callback(_compaction_tasks.discard)
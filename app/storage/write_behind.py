@@ -0,0 +1,79 @@
+import asyncio
+import logging
+from typing import Any
+from app.core import get_storage_write_behind_seconds
+from app.storage import get_storage_backend
+
+class WriteBehindBuffer:
+    """
+    Small whole-object saves (settings, account) that clients send in bursts.
+
+    Every upload is skipped when the stored object already has the same
+    content hash. With a delay, saves return immediately and the latest
+    data per (user_id, path) is written once the delay has passed, so a
+    burst of superseded saves becomes one upload. Writes for a key never
+    overlap, and flush() writes everything pending on shutdown.
+    """
+
+    def __init__(self, storage=None, delay: float = 0.0):
+        self._storage = storage
+        self.delay = delay
+        self._pending = {}  # (user_id, path) -> latest data
+        self._tasks = {}  # (user_id, path) -> flush task
+        self._flush_now = asyncio.Event()
+        self._metrics = {"saves": 0, "coalesced": 0, "uploads": 0, "unchanged": 0, "errors": 0}
+
+    @property
+    def storage(self):
+        return self._storage or get_storage_backend()
+
+    def stats(self) -> dict:
+        return {**self._metrics, "pending": len(self._pending)}
+
+    async def _write(self, user_id: str, path: str, data: Any):
+        uploaded = await self.storage.save_json_if_changed(user_id, path, data)
+        self._metrics["uploads" if uploaded else "unchanged"] += 1
+
+    async def _flush_later(self, key):
+        try:
+            await asyncio.wait_for(self._flush_now.wait(), self.delay)
+        except asyncio.TimeoutError:
+            pass
+        try:
+            # Saves arriving mid-write are picked up by the next iteration
+            while key in self._pending:
+                data = self._pending.pop(key)
+                try:
+                    await self._write(*key, data)
+                except Exception as e:
+                    self._metrics["errors"] += 1
+                    logging.error(f"Write-behind save of {key[1]} failed for user {key[0]}: {e}")
+        finally:
+            self._tasks.pop(key, None)
+
+    async def save(self, user_id: str, path: str, data: Any):
+        self._metrics["saves"] += 1
+        if self.delay <= 0:
+            await self._write(user_id, path, data)
+            return
+        key = (user_id, path)
+        if key in self._pending:
+            self._metrics["coalesced"] += 1
+        self._pending[key] = data
+        if key not in self._tasks:
+            self._tasks[key] = asyncio.create_task(self._flush_later(key))
+
+    async def flush(self):
+        """Write everything pending now; later saves are written without delay."""
+        self._flush_now.set()
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks.values()))
+        logging.info(f"Write-behind buffer flushed: {self.stats()}")
+
+_write_buffer = None
+
+def get_write_buffer() -> WriteBehindBuffer:
+    global _write_buffer
+    if _write_buffer is None:
+        _write_buffer = WriteBehindBuffer(delay=get_storage_write_behind_seconds())
+    return _write_buffer
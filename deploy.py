@@ -1,4 +1,5 @@
 import os
+import json
 import subprocess
 from dotenv import load_dotenv
 import shlex
@@ -75,6 +76,22 @@ def upload_full_backup(zip_path, user_id):
     blob.upload_from_filename(zip_path, content_type='application/zip')
     print("[Upload complete]")
 
+# 5. Publish a new daily content version
+
+def publish_daily_content(json_path, version):
+    if not os.path.isfile(json_path):
+        print(f"[Error] File not found: {json_path}")
+        return
+    client = storage.Client()
+    bucket = client.bucket(FIREBASE_STORAGE_BUCKET)
+    content_path = f"content/daily_content_{version}.json"
+    print(f"[Uploading {json_path} to gs://{FIREBASE_STORAGE_BUCKET}/{content_path} ...]")
+    bucket.blob(content_path).upload_from_filename(json_path, content_type='application/json')
+    # The API reads this manifest instead of listing content/
+    manifest = json.dumps({"version": version, "path": content_path})
+    bucket.blob("content/latest.json").upload_from_string(manifest, content_type='application/json')
+    print("[Publish complete]")
+
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description="Deploy and test Cloud Run service.")
@@ -83,6 +100,8 @@ if __name__ == "__main__":
     parser.add_argument('--test-chat', metavar='ID_TOKEN', help='Test chatAIProxy endpoint with given Firebase ID token')
     parser.add_argument('--upload-backup', metavar='ZIP_PATH', help='Upload a zip file as full_backup for a user')
     parser.add_argument('--user-id', metavar='USER_ID', help='User ID for full_backup upload (required with --upload-backup)')
+    parser.add_argument('--publish-content', metavar='JSON_PATH', help='Publish a daily content file and update content/latest.json')
+    parser.add_argument('--content-version', metavar='N', type=int, help='Version number for --publish-content')
     args = parser.parse_args()
 
     if args.deploy:
@@ -95,4 +114,9 @@ if __name__ == "__main__":
         if not args.user_id:
             print("[Error] --user-id is required with --upload-backup")
         else:
-            upload_full_backup(args.upload_backup, args.user_id) 
\ No newline at end of file
+            upload_full_backup(args.upload_backup, args.user_id)
+    if args.publish_content:
+        if not args.content_version:
+            print("[Error] --content-version is required with --publish-content")
+        else:
+            publish_daily_content(args.publish_content, args.content_version) 
\ No newline at end of file
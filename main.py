@@ -1,10 +1,38 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app.api import backup, chat, settings, account, content, report, version, spotify
 from app.logging_config import setup_logging
+from app.storage import init_storage_backend, close_storage_backend
+from app.storage.write_behind import get_write_buffer
+from app.crash_reports.ingest import get_crash_queue
+from app.llm.http_client import init_http_client, close_http_client
+from app.auth.token_verifier import get_token_verifier
+from app.cache.ttl_cache import cache_stats
+from app.serialization import FastJSONResponse
 
 setup_logging()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Shared clients are created once per process and torn down on shutdown
+    init_storage_backend()
+    init_http_client()
+    await get_token_verifier().start()
+    await asyncio.to_thread(chat.preload_encodings)
+    get_crash_queue().start()
+    yield
+    logging.info(f"Cache stats: {cache_stats()}")
+    await get_token_verifier().stop()
+    await close_http_client()
+    # Buffered writes need the storage backend, so they go first
+    await get_write_buffer().flush()
+    await get_crash_queue().stop()
+    close_storage_backend()
+
+# Every router's dict/list responses are rendered with the fast serializer
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 
 # Include routes
 app.include_router(backup.router)
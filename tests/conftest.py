@@ -0,0 +1,171 @@
+import asyncio
+import gzip
+import hashlib
+import pytest
+from datetime import datetime, timezone
+from app.serialization import canonical_json, dumps, loads
+from app.storage.base import AsyncStorageBackend, StorageConflictError
+
+class FakeUpload:
+    def __init__(self, storage, user_id, path, content_encoding):
+        self._storage = storage
+        self._target = (user_id, path, content_encoding)
+        self._parts = []
+
+    async def write(self, data: bytes):
+        self._parts.append(data)
+
+    async def close(self):
+        user_id, path, content_encoding = self._target
+        await self._storage.save_raw(user_id, path, b"".join(self._parts))
+        key = f"{user_id}/{path}"
+        payload, generation, _ = self._storage.objects[key]
+        self._storage.objects[key] = (payload, generation, content_encoding)
+
+    async def abort(self):
+        self._parts = []
+
+class FakeStorage(AsyncStorageBackend):
+    """
+    In-memory stand-in for ExecutorStorageBackend. Objects are kept as
+    (stored bytes, generation, content_encoding) and conditional writes follow
+    GCS semantics: generation 0 means "must not exist yet". Every call yields
+    to the event loop once, so concurrent callers interleave like real I/O.
+    """
+
+    def __init__(self):
+        self.objects = {}  # "user_id/path" -> (payload, generation, content_encoding)
+        self.shared = {}  # path -> payload
+        self.hashes = {}  # "user_id/path" -> content hash
+        self.created = {}  # "user_id/path" -> creation time
+        self.calls = []
+        self.fail = {}  # method name -> exception raised by the next calls
+        self._generation = 0
+
+    async def _io(self, name: str):
+        self.calls.append(name)
+        await asyncio.sleep(0)
+        if name in self.fail:
+            raise self.fail[name]
+
+    def count(self, name: str) -> int:
+        return self.calls.count(name)
+
+    async def save_raw(self, user_id, path, payload, if_generation_match=None, compress=False):
+        await self._io("save_raw")
+        key = f"{user_id}/{path}"
+        current = self.objects.get(key, (None, 0, None))[1]
+        if if_generation_match is not None and current != if_generation_match:
+            raise StorageConflictError(f"{key}: generation {current}, expected {if_generation_match}")
+        self._generation += 1
+        self.objects[key] = (gzip.compress(payload) if compress else payload, self._generation, "gzip" if compress else None)
+        self.created[key] = datetime.now(timezone.utc)
+        self.hashes.pop(key, None)
+        return self._generation
+
+    async def save_json(self, user_id, path, data, if_generation_match=None, compress=False):
+        return await self.save_raw(user_id, path, dumps(data), if_generation_match, compress)
+
+    async def save_json_if_changed(self, user_id, path, data):
+        digest = hashlib.sha256(canonical_json(data)).hexdigest()
+        key = f"{user_id}/{path}"
+        if self.hashes.get(key) == digest:
+            await self._io("stat")
+            return False
+        await self.save_json(user_id, path, data)
+        self.hashes[key] = digest
+        return True
+
+    async def open_upload(self, user_id, path, chunk_size, content_encoding=None):
+        await self._io("open_upload")
+        return FakeUpload(self, user_id, path, content_encoding)
+
+    async def load_raw(self, user_id, path):
+        await self._io("load_raw")
+        key = f"{user_id}/{path}"
+        if key not in self.objects:
+            raise FileNotFoundError(path)
+        payload, _, content_encoding = self.objects[key]
+        return payload, content_encoding
+
+    async def load_json(self, user_id, path):
+        payload, content_encoding = await self.load_raw(user_id, path)
+        return loads(gzip.decompress(payload) if content_encoding == "gzip" else payload)
+
+    async def load_json_or_default(self, user_id, path, default=None):
+        await self._io("load")
+        key = f"{user_id}/{path}"
+        if key not in self.objects:
+            return default, 0
+        payload, generation, content_encoding = self.objects[key]
+        return loads(gzip.decompress(payload) if content_encoding == "gzip" else payload), generation
+
+    async def open_raw_stream(self, user_id, path, chunk_size):
+        await self._io("stat")
+        key = f"{user_id}/{path}"
+        if key not in self.objects:
+            raise FileNotFoundError(path)
+        payload, _, content_encoding = self.objects[key]
+
+        async def chunks():
+            for start in range(0, len(payload), chunk_size):
+                await self._io("range")
+                yield payload[start:start + chunk_size]
+
+        return len(payload), content_encoding, chunks()
+
+    async def read_raw_range(self, user_id, path, start, end, generation):
+        await self._io("range")
+        payload, current, _ = self.objects.get(f"{user_id}/{path}", (None, 0, None))
+        if current != generation:
+            raise FileNotFoundError(f"{path} (generation {generation})")
+        return payload[start:end + 1]
+
+    async def file_exists(self, user_id, path):
+        await self._io("stat")
+        return f"{user_id}/{path}" in self.objects
+
+    async def delete(self, user_id, path):
+        await self._io("delete")
+        self.objects.pop(f"{user_id}/{path}", None)
+
+    async def list_generations(self, user_id, prefix):
+        await self._io("list")
+        user_prefix = f"{user_id}/"
+        return {
+            key[len(user_prefix):]: generation
+            for key, (_, generation, _) in sorted(self.objects.items())
+            if key.startswith(user_prefix + prefix)
+        }
+
+    async def list_full_backup_paths(self, user_id):
+        return list(await self.list_generations(user_id, "full_backups/"))
+
+    async def list_created_times(self, user_id, prefix):
+        await self._io("list")
+        user_prefix = f"{user_id}/"
+        return {key[len(user_prefix):]: created for key, created in sorted(self.created.items()) if key in self.objects and key.startswith(user_prefix + prefix)}
+
+    async def save_object_bytes(self, path, payload, content_type):
+        await self._io("save_object_bytes")
+        self.shared[path] = payload
+
+    async def load_object_json(self, path):
+        await self._io("load")
+        if path not in self.shared:
+            raise FileNotFoundError(path)
+        return loads(self.shared[path])
+
+    async def load_object_json_or_default(self, path, default=None):
+        try:
+            return await self.load_object_json(path), 1
+        except FileNotFoundError:
+            return default, 0
+
+    async def list_object_names(self, prefix):
+        await self._io("list")
+        return sorted(path for path in self.shared if path.startswith(prefix))
+
+@pytest.fixture
+def storage():
+    return FakeStorage()
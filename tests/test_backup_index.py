@@ -0,0 +1,70 @@
+import pytest
+from datetime import timedelta
+from app.storage.backup_index import DOCUMENT_FORMAT, INDEX_PATH, BackupIndex, backup_path, prune_backups
+from app.storage.chunked_backup import CHUNKED_FORMAT, CHUNKS_PREFIX, ChunkedBackupStore
+
+def backup(day, moods):
+    return {"exportedAt": f"{day}T08:00:00Z", "data": {f"2024-01-{index + 1:02d}": {"mood": mood} for index, mood in enumerate(moods)}}
+
+def chunk_paths(storage, user_id="u1"):
+    return {key.split("/", 1)[1] for key in storage.objects if key.startswith(f"{user_id}/{CHUNKS_PREFIX}/")}
+
+def age_everything(storage, hours=2):
+    for key in storage.created:
+        storage.created[key] -= timedelta(hours=hours)
+
+async def save(storage, day, moods):
+    index = BackupIndex(storage)
+    path = backup_path(day)
+    await ChunkedBackupStore(storage).save("u1", path, backup(day, moods), await index.latest_path("u1"))
+    return await index.record("u1", day, path, CHUNKED_FORMAT)
+
+def test_prune_backups_keeps_newest():
+    backups = {"2024-06-01": {}, "2024-06-05": {}, "2024-06-10": {}}
+    assert prune_backups(backups, "2024-06-10", 2, 0) == ["2024-06-01"]
+    assert prune_backups(backups, "2024-06-10", 0, 3) == ["2024-06-01", "2024-06-05"]
+    assert prune_backups({"2024-01-01": {}}, "2024-06-10", 0, 3) == []
+
+async def test_pruning_deletes_chunks_no_kept_backup_uses(storage, monkeypatch):
+    monkeypatch.setenv("FULL_BACKUP_RETENTION_COUNT", "1")
+    await save(storage, "2024-06-09", [1, 2])
+    old_chunks = chunk_paths(storage)
+    age_everything(storage)
+
+    assert await save(storage, "2024-06-10", [1, 3]) == ["2024-06-09"]
+
+    kept = {f"{CHUNKS_PREFIX}/{section['chunk']}.json" for section in (await storage.load_json("u1", backup_path("2024-06-10")))["sections"]}
+    assert chunk_paths(storage) == kept
+    assert old_chunks - kept
+    assert not await storage.file_exists("u1", backup_path("2024-06-09"))
+
+async def test_sweep_keeps_recent_unreferenced_chunks(storage, monkeypatch):
+    monkeypatch.setenv("FULL_BACKUP_RETENTION_COUNT", "1")
+    await save(storage, "2024-06-09", [1, 2])
+    # Not aged: they might belong to a save still in flight
+    old_chunks = chunk_paths(storage)
+    await save(storage, "2024-06-10", [4, 5])
+    assert old_chunks <= chunk_paths(storage)
+
+async def test_sweep_skipped_while_formats_are_unknown(storage, monkeypatch):
+    monkeypatch.setenv("FULL_BACKUP_RETENTION_COUNT", "2")
+    await save(storage, "2024-06-08", [1])
+    await storage.save_json("u1", backup_path("2024-06-09"), backup("2024-06-09", [2]))
+    index, _ = await storage.load_json_or_default("u1", INDEX_PATH)
+    index["backups"]["2024-06-09"] = {"path": backup_path("2024-06-09"), "savedAt": None, "format": None}
+    await storage.save_json("u1", INDEX_PATH, index)
+    age_everything(storage)
+    before = chunk_paths(storage)
+
+    await save(storage, "2024-06-10", [3])
+
+    # The 2024-06-08 chunks are no longer referenced, but the unknown entry blocks the sweep
+    assert before <= chunk_paths(storage)
+
+async def test_document_backups_reference_no_chunks(storage, monkeypatch):
+    monkeypatch.setenv("FULL_BACKUP_RETENTION_COUNT", "1")
+    await save(storage, "2024-06-09", [1])
+    age_everything(storage)
+    await storage.save_json("u1", backup_path("2024-06-10"), backup("2024-06-10", [2]))
+    await BackupIndex(storage).record("u1", "2024-06-10", backup_path("2024-06-10"), DOCUMENT_FORMAT)
+    assert chunk_paths(storage) == set()
@@ -0,0 +1,35 @@
+import pytest
+from app.serialization import loads
+from app.storage.chunked_backup import ChunkedBackupStore, is_chunked_manifest
+
+def backup(days=600):
+    return {
+        "exportedAt": "2024-06-10T08:00:00Z",
+        "data": {f"2023-{day:04d}": {"mood": day % 7, "note": "x" * 400} for day in range(days)},
+        "settings": {"theme": "dark"},
+        "empty": {},
+    }
+
+async def restore(store, storage, path, chunk_size):
+    manifest = await storage.load_json("u1", path)
+    assert is_chunked_manifest(manifest)
+    return loads(b"".join([piece async for piece in store.stream("u1", manifest, chunk_size)]))
+
+@pytest.mark.parametrize("chunk_size", [7, 4096, 1024 * 1024])
+async def test_stream_restores_the_original_document(storage, chunk_size):
+    store = ChunkedBackupStore(storage)
+    body = backup()
+    await store.save("u1", "full_backups/2024-06-10.json", body)
+    assert await restore(store, storage, "full_backups/2024-06-10.json", chunk_size) == body
+
+async def test_only_changed_sections_are_uploaded(storage):
+    store = ChunkedBackupStore(storage)
+    body = backup()
+    first = await store.save("u1", "full_backups/2024-06-09.json", body)
+    assert first["chunks_uploaded"] == first["sections"]
+
+    body["data"]["2023-0007"]["mood"] = 99
+    second = await store.save("u1", "full_backups/2024-06-10.json", body, "full_backups/2024-06-09.json")
+
+    assert second["chunks_uploaded"] == 1
+    assert await restore(store, storage, "full_backups/2024-06-10.json", 4096) == body
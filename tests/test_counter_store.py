@@ -0,0 +1,72 @@
+import asyncio
+import pytest
+from app.rate_limit.counter_store import GCSCounterStore, InMemoryCounterStore
+from app.rate_limit.limiter import RateLimiter
+from app.storage.base import StorageConflictError
+
+DAY = "2024-06-10"
+
+@pytest.fixture(params=["memory", "gcs"])
+def store(request, storage):
+    if request.param == "memory":
+        return InMemoryCounterStore()
+    # Every racing request can lose to the others once, so allow enough attempts
+    return GCSCounterStore(storage, max_attempts=50)
+
+async def test_concurrent_reserves_never_exceed_limit(store):
+    reservations = await asyncio.gather(*(store.check_and_reserve("u1", DAY, 5) for _ in range(12)))
+    assert sum(reservation.allowed for reservation in reservations) == 5
+    assert (await store.get_usage("u1", DAY))["messages"] == 5
+
+async def test_commit_and_release_settle_reservations(store):
+    reservations = await asyncio.gather(*(store.check_and_reserve("u1", DAY, 10) for _ in range(4)))
+    await asyncio.gather(
+        store.commit(reservations[0], 100),
+        store.commit(reservations[1], 50),
+        store.release(reservations[2]),
+        store.release(reservations[3]),
+    )
+    assert await store.get_usage("u1", DAY) == {"messages": 2, "tokens": 150}
+
+async def test_release_frees_a_slot_for_the_next_request(store):
+    first = await store.check_and_reserve("u1", DAY, 1)
+    assert not (await store.check_and_reserve("u1", DAY, 1)).allowed
+    await store.release(first)
+    assert (await store.check_and_reserve("u1", DAY, 1)).allowed
+
+async def test_update_retries_after_conflict(storage):
+    store = GCSCounterStore(storage)
+    await store.check_and_reserve("u1", DAY, 10)
+    # Another instance writes behind this one's cached generation
+    data, generation = await storage.load_json_or_default("u1", GCSCounterStore.path)
+    data["days"][DAY]["messages"] = 3
+    await storage.save_json("u1", GCSCounterStore.path, data, if_generation_match=generation)
+    storage.calls.clear()
+
+    reservation = await store.check_and_reserve("u1", DAY, 10)
+
+    assert reservation.allowed
+    assert reservation.usage["messages"] == 4
+    assert storage.count("save_raw") == 2
+    assert storage.count("load") == 1
+
+async def test_update_gives_up_after_max_attempts(storage):
+    store = GCSCounterStore(storage, max_attempts=3)
+    storage.fail["save_raw"] = StorageConflictError("lost the race")
+    with pytest.raises(StorageConflictError):
+        await store.check_and_reserve("u1", DAY, 10)
+    assert storage.count("save_raw") == 3
+
+async def test_cached_generation_skips_the_read(storage):
+    store = GCSCounterStore(storage)
+    reservation = await store.check_and_reserve("u1", DAY, 10)
+    storage.calls.clear()
+    await store.commit(reservation, 20)
+    assert storage.calls == ["save_raw"]
+
+async def test_limiter_commit_failure_returns_reserved_usage(storage):
+    limiter = RateLimiter("u1", store=GCSCounterStore(storage))
+    ok, _ = await limiter.check_and_reserve(10)
+    assert ok
+    storage.fail["save_raw"] = OSError("storage unavailable")
+    assert await limiter.commit(10) == {"messages": 1, "tokens": 0}
@@ -0,0 +1,65 @@
+from app.crash_reports.ingest import CrashIngestQueue, crash_fingerprint
+from app.serialization import loads
+
+def report(address="0x7ffd1234", version="1.0"):
+    return {"error": "NullPointerException", "stackTrace": f"at Foo.bar({address})\nat Main.run", "appVersion": version}
+
+def segments(storage):
+    return [[loads(line) for line in payload.splitlines()] for payload in storage.shared.values()]
+
+def test_fingerprint_ignores_addresses():
+    assert crash_fingerprint("E", "at x(0x1)", "1.0") == crash_fingerprint("E", "at x(0xdeadbeef)", "1.0")
+    assert crash_fingerprint("E", "at x(0x1)", "1.0") != crash_fingerprint("E", "at x(0x1)", "1.1")
+
+async def test_reports_are_grouped_into_one_segment(storage):
+    queue = CrashIngestQueue(storage, samples_per_group=2)
+    for index in range(5):
+        assert queue.add(f"user{index % 2}", report(address=hex(index)))
+    queue.add("user0", report(version="2.0"))
+    await queue.flush()
+
+    [groups] = segments(storage)
+    assert sorted(group["count"] for group in groups) == [1, 5]
+    storm = max(groups, key=lambda group: group["count"])
+    assert storm["users"] == ["user0", "user1"]
+    assert len(storm["samples"]) == 2
+    assert queue.stats()["written"] == 6
+
+async def test_full_buffer_drops_new_groups(storage):
+    queue = CrashIngestQueue(storage, max_groups=1)
+    assert queue.add("u1", report(version="1.0"))
+    assert not queue.add("u1", report(version="2.0"))
+    assert queue.add("u1", report(version="1.0"))
+    assert queue.stats()["dropped_full"] == 1
+
+async def test_failed_flush_is_retried_with_reports_merged(storage):
+    queue = CrashIngestQueue(storage)
+    queue.add("u1", report())
+    buffered = queue.stats()["buffered_bytes"]
+    storage.fail["save_object_bytes"] = OSError("storage unavailable")
+    await queue.flush()
+    assert queue.stats()["buffered_bytes"] == buffered
+
+    queue.add("u2", report())
+    del storage.fail["save_object_bytes"]
+    await queue.flush()
+
+    [[group]] = segments(storage)
+    assert group["count"] == 2
+    assert group["users"] == ["u1", "u2"]
+    assert queue.stats()["buffered_bytes"] == 0
+
+async def test_restore_recounts_merged_group_size(storage):
+    queue = CrashIngestQueue(storage, samples_per_group=2)
+    queue.add("u1", report())
+    queue.add("u2", report())
+    storage.fail["save_object_bytes"] = OSError("storage unavailable")
+    await queue.flush()
+    queue.add("u3", report())
+    await queue.flush()
+
+    [group] = queue._groups.values()
+    assert [sample["userId"] for sample in group.samples] == ["u1", "u2"]
+    assert queue.stats()["buffered_bytes"] == group.size
+    group.resize()
+    assert queue.stats()["buffered_bytes"] == group.size
@@ -0,0 +1,68 @@
+import gc
+import threading
+import time
+from unittest import mock
+from google.cloud.storage.fileio import BlobWriter
+from app.storage.executor_storage import ExecutorStorageBackend
+
+class WriterBackend:
+    def __init__(self):
+        self.blob = mock.MagicMock()
+
+    def open_writer(self, user_id, path, chunk_size, content_encoding=None):
+        return BlobWriter(self.blob, chunk_size=chunk_size, ignore_flush=True)
+
+async def open_partial_upload(backend):
+    storage = ExecutorStorageBackend(backend, max_workers=1)
+    upload = await storage.open_upload("u1", "full_backups/2024-06-10.json", 256 * 1024)
+    await upload.write(b'{"exportedAt": "2024-06-10", "data": {')
+    return upload
+
+async def test_dropped_upload_is_committed_on_collection():
+    # The reason abort() exists: a writer that is just dropped uploads what it holds
+    backend = WriterBackend()
+    upload = await open_partial_upload(backend)
+    del upload
+    gc.collect()
+    assert backend.blob._initiate_resumable_upload.called
+
+async def test_aborted_upload_stores_nothing():
+    backend = WriterBackend()
+    upload = await open_partial_upload(backend)
+    await upload.abort()
+    del upload
+    gc.collect()
+    assert backend.blob.method_calls == []
+
+def test_backends_implement_the_whole_interface():
+    from app.storage.firebase_storage import FirebaseStorageBackend
+    assert not FirebaseStorageBackend.__abstractmethods__
+    assert not ExecutorStorageBackend.__abstractmethods__
+
+class RangeBackend:
+    """Sync backend serving one object by ranges, tracking reads in flight."""
+
+    def __init__(self, payload: bytes):
+        self.payload = payload
+        self.lock = threading.Lock()
+        self.in_flight = self.max_in_flight = 0
+
+    def stat_raw(self, user_id, path):
+        return len(self.payload), None, 7
+
+    def read_raw_range(self, user_id, path, start, end, generation):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.01)
+        with self.lock:
+            self.in_flight -= 1
+        return self.payload[start:end + 1]
+
+async def test_raw_stream_reads_ahead_in_order():
+    backend = RangeBackend(bytes(range(256)) * 40)
+    storage = ExecutorStorageBackend(backend, max_workers=8)
+    size, _, chunks = await storage.open_raw_stream("u1", "full_backups/2024-06-10.json", 100, read_ahead=3)
+    assert size == len(backend.payload)
+    assert b"".join([chunk async for chunk in chunks]) == backend.payload
+    assert backend.max_in_flight == 4
@@ -0,0 +1,65 @@
+import httpx
+import pytest
+from app.llm.http_client import create_http_client
+from app.llm.provider import LLMProviderError, OpenAIProvider
+from app.serialization import dumps, loads
+
+def completion(content):
+    return {"choices": [{"message": {"role": "assistant", "content": content}}], "usage": {"prompt_tokens": 12, "completion_tokens": 3}}
+
+def stream_body(*contents):
+    chunks = [{"choices": [{"delta": {"content": content}}]} for content in contents]
+    chunks.append({"choices": [], "usage": {"prompt_tokens": 12}})
+    return b"".join(b"data: " + dumps(chunk) + b"\n\n" for chunk in chunks) + b"data: [DONE]\n\n"
+
+def mock_api(handler):
+    """A client for a stand-in OpenAI API, as OPENAI_API_BASE would point at in a local setup."""
+    requests = []
+
+    def record(request):
+        requests.append(request)
+        return handler(request)
+
+    client = httpx.AsyncClient(base_url="http://openai.test/v1", transport=httpx.MockTransport(record))
+    return OpenAIProvider(client), requests
+
+def test_client_uses_configured_api_base(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_BASE", "http://localhost:8001/v1")
+    monkeypatch.setenv("OPENAI_HTTP2", "false")
+    assert str(create_http_client().base_url) == "http://localhost:8001/v1/"
+
+async def test_chat_posts_completion_request(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    provider, requests = mock_api(lambda request: httpx.Response(200, content=dumps(completion("Keep going!"))))
+
+    data = await provider.chat([{"role": "user", "content": "hi"}], model="gpt-4o", max_tokens=50, temperature=1.0)
+
+    assert data["choices"][0]["message"]["content"] == "Keep going!"
+    [request] = requests
+    assert request.url == "http://openai.test/v1/chat/completions"
+    assert request.headers["authorization"] == "Bearer sk-test"
+    assert loads(request.content) == {"model": "gpt-4o", "messages": [{"role": "user", "content": "hi"}], "max_tokens": 50, "temperature": 1.0}
+
+async def test_chat_error_carries_upstream_status():
+    provider, _ = mock_api(lambda request: httpx.Response(429, text="rate limited"))
+    with pytest.raises(LLMProviderError) as raised:
+        await provider.chat([{"role": "user", "content": "hi"}])
+    assert raised.value.status_code == 429
+    assert raised.value.body == "rate limited"
+
+async def test_stream_chat_yields_chunks_until_done():
+    provider, requests = mock_api(lambda request: httpx.Response(200, content=stream_body("Keep", " going")))
+
+    chunks = [chunk async for chunk in provider.stream_chat([{"role": "user", "content": "hi"}], model="gpt-4o")]
+
+    assert [chunk["choices"][0]["delta"]["content"] for chunk in chunks[:-1]] == ["Keep", " going"]
+    assert chunks[-1]["usage"] == {"prompt_tokens": 12}
+    payload = loads(requests[0].content)
+    assert payload["stream"] is True
+    assert payload["stream_options"] == {"include_usage": True}
+
+async def test_stream_chat_error_before_first_chunk():
+    provider, _ = mock_api(lambda request: httpx.Response(500, text="upstream down"))
+    with pytest.raises(LLMProviderError) as raised:
+        await anext(provider.stream_chat([{"role": "user", "content": "hi"}]))
+    assert raised.value.status_code == 500
@@ -0,0 +1,89 @@
+import asyncio
+import httpx
+import pytest
+from app.llm.provider import LLMProviderError
+from app.llm.router import ModelRouter
+
+def attempts(**behaviour):
+    """
+    Build a call(model) factory. Each model maps to (delay, outcome): an
+    exception is raised after the delay, anything else is returned.
+    """
+    started = []
+
+    async def call(model):
+        started.append(model)
+        delay, outcome = behaviour[model]
+        await asyncio.sleep(delay)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+    return call, started
+
+async def test_primary_success_does_not_touch_fallback():
+    call, started = attempts(primary=(0, "a"), fallback=(0, "b"))
+    assert await ModelRouter("primary", "fallback").route(call) == ("a", "primary")
+    assert started == ["primary"]
+
+@pytest.mark.parametrize("error", [LLMProviderError(429, "slow down"), LLMProviderError(503, "down"), httpx.ConnectError("reset")])
+async def test_retryable_error_falls_back(error):
+    call, started = attempts(primary=(0, error), fallback=(0, "b"))
+    assert await ModelRouter("primary", "fallback").route(call) == ("b", "fallback")
+    assert started == ["primary", "fallback"]
+
+async def test_client_error_is_not_retried():
+    call, started = attempts(primary=(0, LLMProviderError(400, "bad request")), fallback=(0, "b"))
+    with pytest.raises(LLMProviderError):
+        await ModelRouter("primary", "fallback").route(call)
+    assert started == ["primary"]
+
+async def test_last_error_raised_when_both_fail():
+    call, _ = attempts(primary=(0, LLMProviderError(500, "one")), fallback=(0, LLMProviderError(502, "two")))
+    with pytest.raises(LLMProviderError) as raised:
+        await ModelRouter("primary", "fallback").route(call)
+    assert raised.value.status_code == 502
+
+async def test_hedge_starts_fallback_when_primary_is_slow():
+    call, started = attempts(primary=(1, "a"), fallback=(0, "b"))
+    assert await ModelRouter("primary", "fallback", hedge_after=0.01).route(call) == ("b", "fallback")
+    assert started == ["primary", "fallback"]
+
+async def test_losing_result_is_discarded():
+    call, _ = attempts(primary=(1, "a"), fallback=(0, "b"))
+    discarded = []
+
+    async def discard(result):
+        discarded.append(result)
+
+    async def finish_on_cancel(model):
+        try:
+            return await call(model)
+        except asyncio.CancelledError:
+            # The losing attempt got its answer anyway, e.g. an opened stream
+            return "late"
+
+    router = ModelRouter("primary", "fallback", hedge_after=0.01)
+    assert await router.route(finish_on_cancel, discard) == ("b", "fallback")
+    assert discarded == ["late"]
+
+async def test_cancelling_route_during_cleanup_is_not_swallowed():
+    cleanup_started = asyncio.Event()
+
+    async def call(model):
+        if model == "primary":
+            await asyncio.sleep(0.05)
+            return "a"
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            # Slow cleanup of the losing attempt, e.g. closing a connection
+            cleanup_started.set()
+            await asyncio.sleep(1)
+            raise
+
+    route = asyncio.create_task(ModelRouter("primary", "fallback", hedge_after=0.01).route(call))
+    await cleanup_started.wait()
+    route.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await route
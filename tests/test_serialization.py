@@ -0,0 +1,22 @@
+import pytest
+from app import serialization
+from app.serialization import canonical_json, dumps, loads
+
+VALUES = [
+    {"b": 1, "a": [1.5, None, True, "ü"], "nested": {"x": {}}},
+    {"nan": float("nan"), "inf": [float("inf"), float("-inf")], "ok": 0.25},
+    [float("nan"), (1, 2)],
+]
+
+@pytest.mark.parametrize("value", VALUES)
+def test_stdlib_fallback_matches_orjson(monkeypatch, value):
+    with_orjson = dumps(value)
+    monkeypatch.setattr(serialization, "orjson", None)
+    assert dumps(value) == with_orjson
+
+def test_non_finite_floats_become_null():
+    assert loads(dumps({"score": float("nan")})) == {"score": None}
+    assert canonical_json({"b": float("inf"), "a": 1}) == b'{"a":1,"b":null}'
+
+def test_big_integers_fall_back_to_stdlib():
+    assert dumps({"n": 2 ** 70}) == b'{"n":1180591620717411303424}'
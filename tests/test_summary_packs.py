@@ -0,0 +1,47 @@
+import asyncio
+from datetime import date
+from app.serialization import loads
+from app.storage.summary_packs import SummaryPackStore, pack_index_path, summary_path
+
+async def store_days(storage, days):
+    for day in days:
+        await storage.save_json("u1", summary_path(day), {"date": day, "mood": len(day)})
+
+async def test_read_range_without_packs_reads_day_files(storage):
+    await store_days(storage, ["2024-05-01", "2024-05-03", "2024-06-01"])
+    summaries = await SummaryPackStore(storage).read_range("u1", date(2024, 5, 2), date(2024, 6, 30), use_packs=False)
+    assert list(summaries) == ["2024-05-03", "2024-06-01"]
+    assert loads(summaries["2024-05-03"])["date"] == "2024-05-03"
+
+async def test_compacted_month_is_read_with_one_ranged_fetch(storage):
+    days = ["2024-05-01", "2024-05-02", "2024-05-20"]
+    await store_days(storage, days)
+    store = SummaryPackStore(storage)
+    assert await store.compact("u1", "2024-05") == 3
+    storage.calls.clear()
+
+    summaries = await store.read_range("u1", date(2024, 5, 2), date(2024, 5, 31))
+
+    assert {day: loads(raw) for day, raw in summaries.items()} == {day: {"date": day, "mood": 10} for day in days[1:]}
+    assert storage.calls == ["load", "range"]
+
+async def test_write_to_packed_month_invalidates_index(storage):
+    await store_days(storage, ["2024-05-01"])
+    store = SummaryPackStore(storage)
+    await store.compact("u1", "2024-05")
+    await storage.save_json("u1", summary_path("2024-05-01"), {"date": "2024-05-01", "mood": 0})
+    await store.after_write("u1", "2024-05-01")
+
+    assert not await storage.file_exists("u1", pack_index_path("2024-05"))
+    summaries = await store.read_range("u1", date(2024, 5, 1), date(2024, 5, 1))
+    assert loads(summaries["2024-05-01"])["mood"] == 0
+    # The read found no pack and queued a fresh compaction
+    await asyncio.sleep(0.01)
+    assert await storage.file_exists("u1", pack_index_path("2024-05"))
+
+async def test_empty_month_gets_an_empty_index(storage):
+    store = SummaryPackStore(storage)
+    assert await store.compact("u1", "2024-04") == 0
+    storage.calls.clear()
+    assert await store.read_range("u1", date(2024, 4, 1), date(2024, 4, 30)) == {}
+    assert storage.calls == ["load"]
@@ -0,0 +1,44 @@
+import asyncio
+from app.storage.write_behind import WriteBehindBuffer
+
+async def test_without_delay_saves_are_written_inline(storage):
+    buffer = WriteBehindBuffer(storage)
+    await buffer.save("u1", "settings.json", {"theme": "dark"})
+    assert await storage.load_json("u1", "settings.json") == {"theme": "dark"}
+
+async def test_unchanged_content_is_not_uploaded(storage):
+    buffer = WriteBehindBuffer(storage)
+    await buffer.save("u1", "settings.json", {"theme": "dark", "lang": "en"})
+    await buffer.save("u1", "settings.json", {"lang": "en", "theme": "dark"})
+    assert storage.count("save_raw") == 1
+    assert buffer.stats()["unchanged"] == 1
+
+async def test_burst_is_coalesced_into_latest_write(storage):
+    buffer = WriteBehindBuffer(storage, delay=60)
+    for version in range(5):
+        await buffer.save("u1", "settings.json", {"version": version})
+    await buffer.save("u1", "account.json", {"name": "a"})
+    assert storage.count("save_raw") == 0
+
+    await buffer.flush()
+
+    assert await storage.load_json("u1", "settings.json") == {"version": 4}
+    assert storage.count("save_raw") == 2
+    assert buffer.stats() == {"saves": 6, "coalesced": 4, "uploads": 2, "unchanged": 0, "errors": 0, "pending": 0}
+
+async def test_save_during_write_is_written_after_it(storage):
+    buffer = WriteBehindBuffer(storage, delay=0.01)
+    await buffer.save("u1", "settings.json", {"version": 1})
+    # Let the flush task start its write, then save again mid-write
+    while not storage.calls:
+        await asyncio.sleep(0)
+    await buffer.save("u1", "settings.json", {"version": 2})
+    await buffer.flush()
+    assert await storage.load_json("u1", "settings.json") == {"version": 2}
+
+async def test_failed_write_is_counted(storage):
+    buffer = WriteBehindBuffer(storage, delay=60)
+    storage.fail["save_raw"] = OSError("storage unavailable")
+    await buffer.save("u1", "settings.json", {"version": 1})
+    await buffer.flush()
+    assert buffer.stats()["errors"] == 1